@@ -20,7 +20,13 @@
 #include <cmath>
 #include <algorithm>
 #include <regex>
+#include <cctype> // std::isdigit, std::isalnum
+#include <cstdio> // std::rename, std::snprintf
 #include <memory>
+#include <cstdint> // uint64_t
+#include <fstream>
+#include <sstream>
+#include <sys/stat.h> // mkdir
 #include "FWCore/Framework/interface/Frameworkfwd.h"
 #include "FWCore/Framework/interface/one/EDAnalyzer.h"
 #include "FWCore/Framework/interface/Event.h"
@@ -32,6 +38,89 @@
 #include "DataFormats/Common/interface/TriggerResults.h"
 #include "DataFormats/PatCandidates/interface/TriggerObjectStandAlone.h"
 
+class PatternMatcher {
+  // Match strings against a list of patterns with '*' wildcards, compiled once:
+  //  - literal patterns are matched with a substring search,
+  //  - wildcard patterns are matched with an ordered substring search of their segments,
+  //    equivalent to an unanchored regex with ".*" for each wildcard,
+  //  - patterns with other regex characters are combined in one alternation regex.
+  
+  public:
+    PatternMatcher() { }
+    PatternMatcher(const std::vector<std::string>&, const std::string& tag="");
+    bool empty() const { return npatterns_==0; }
+    bool match(const std::string&) const;
+  
+  private:
+    std::size_t npatterns_ = 0;
+    std::vector<std::string> literals_;
+    std::vector<std::vector<std::string>> wildcards_;
+    bool useRegex_ = false;
+    std::regex regex_;
+};
+
+
+PatternMatcher::PatternMatcher(const std::vector<std::string>& patterns, const std::string& tag)
+  : npatterns_(patterns.size())
+{
+  std::string regexp;
+  for(auto const& pattern: patterns){
+    if(pattern.find('*')==std::string::npos){ // literal
+      literals_.push_back(pattern+tag);
+    }else if(pattern.find_first_of(".^$|()[]{}+?\\")==std::string::npos){ // simple wildcards
+      std::vector<std::string> segments;
+      std::size_t start = 0, end;
+      while((end = pattern.find('*',start))!=std::string::npos){
+        if(end>start) segments.push_back(pattern.substr(start,end-start));
+        start = end+1;
+      }
+      segments.push_back(pattern.substr(start)+tag); // last segment may be empty
+      wildcards_.push_back(segments);
+    }else{ // regex
+      std::string patternexp(pattern);
+      for(std::size_t pos=0; (pos = patternexp.find('*',pos))!=std::string::npos; pos += 2)
+        patternexp.replace(pos,1,".*");
+      if(!regexp.empty()) regexp += "|";
+      regexp += "(?:"+patternexp+tag+")";
+    }
+  }
+  if(!regexp.empty()){
+    regex_    = std::regex(regexp,std::regex::ECMAScript|std::regex::optimize);
+    useRegex_ = true;
+  }
+}
+
+
+bool PatternMatcher::match(const std::string& str) const {
+  for(auto const& literal: literals_){
+    if(str.find(literal)!=std::string::npos) return true;
+  }
+  for(auto const& segments: wildcards_){
+    std::size_t pos = 0;
+    bool matched = true;
+    for(auto const& segment: segments){
+      pos = str.find(segment,pos);
+      if(pos==std::string::npos){ matched = false; break; }
+      pos += segment.size();
+    }
+    if(matched) return true;
+  }
+  if(useRegex_ and std::regex_search(str,regex_)) return true;
+  return false;
+}
+
+
+struct MenuData {
+  // Paths of an HLT menu with their ordered module labels and EDM types,
+  // which can be cached on disk to skip the extraction from the HLT configuration.
+  typedef std::vector<std::pair<std::string,std::string>> Modules; // (label, EDM type)
+  std::string tableName;
+  std::string process;
+  std::string globalTag;
+  std::vector<std::pair<std::string,Modules>> paths; // (path, modules)
+};
+
+
 class TriggerChecks
   //: public edm::one::EDAnalyzer<edm::one::SharedResources> {
   : public edm::one::EDAnalyzer<edm::one::WatchRuns> {
@@ -46,19 +135,27 @@ class TriggerChecks
     bool ignoreFilter(const std::string&);
   
   private:
-    virtual void beginJob() override { }
+    virtual void beginJob() override;
     virtual void beginRun(const edm::Run&, const edm::EventSetup&) override;
     virtual void analyze(const edm::Event&, const edm::EventSetup&) override;
     virtual void endRun(const edm::Run&, const edm::EventSetup&) override { }
     virtual void endJob() override;
-    bool select(const std::string&, const std::vector<std::string>);
-    void preparePatterns(std::vector<std::string>&, const std::string);
+    void extractMenu(MenuData&);
+    void processMenu(const MenuData&, const std::string&);
+    std::string menuCacheFile(const std::string&, const std::string&);
+    bool loadMenu(MenuData&, const std::string&, const std::string&);
+    void saveMenu(const MenuData&);
+    void resolvePaths(unsigned int);
+    std::vector<uint64_t>& getCounts(unsigned int, unsigned int);
+    void printCounts();
+    void writeJSON(const std::string&);
     std::string removeVersionLabel(const std::string&);
+    std::string getModuleType(const std::string&);
     std::string getTypelabel(const std::string&);
     bool verbose_ = false;
     int nlast_ = 1; // number of last filters
     HLTConfigProvider hltConfig_;
-    //edm::EDGetTokenT<edm::TriggerResults> triggerBits_;
+    edm::EDGetTokenT<edm::TriggerResults> triggerBits_;
     std::map<std::string,std::set<std::string>> trigTables_;
     std::map<std::string,std::set<std::string>> trigFiltersAll_;
     std::map<std::string,std::map<std::string,std::set<std::string>>> trigFilters_;
@@ -83,6 +180,26 @@ class TriggerChecks
     std::vector<std::string> ignoreFilters_;
     std::vector<std::string> vetoTriggers_;
     std::vector<std::string> checkFilters_;
+    PatternMatcher triggerMatcher_;
+    PatternMatcher vetoTriggerMatcher_;
+    PatternMatcher filterMatcher_;
+    PatternMatcher checkFilterMatcher_;
+    PatternMatcher ignoreFilterMatcher_;
+    std::map<std::string,std::string> moduleTypes_; // cache of module EDM types for current menu
+    std::string menuCacheDir_; // directory of cached menus
+    std::vector<std::string> cachedMenus_; // report these cached menus without data
+    std::string outputJSON_; // write summary to this JSON file
+    std::map<std::string,std::map<std::string,std::vector<std::string>>> lastFilters_; // global tag -> path -> ordered last filters
+    std::map<std::string,std::map<std::string,std::map<std::string,std::string>>> checkedFilters_; // global tag -> path -> filter -> type
+    bool countPaths_ = false; // count accepts of selected paths per run & lumi
+    std::vector<std::string> countPaths_names_; // column -> path (without version label)
+    std::map<std::string,std::size_t> countPaths_columns_; // path -> column
+    std::vector<unsigned int> countIndices_; // trigger index in TriggerResults of current menu
+    std::vector<std::size_t> countColumns_; // column of each trigger index
+    std::map<unsigned int,std::vector<bool>> availablePaths_; // run -> column -> path in menu
+    std::map<std::pair<unsigned int,unsigned int>,std::vector<uint64_t>> lumiCounts_; // (run, lumi) -> [ events, accepts per column ]
+    std::pair<unsigned int,unsigned int> lastLumi_ = {0,0};
+    std::vector<uint64_t>* lastCounts_ = nullptr;
 };
 
 
@@ -99,13 +216,36 @@ TriggerChecks::TriggerChecks(const edm::ParameterSet& iConfig)
   vetoTriggers_      = iConfig.getUntrackedParameter<std::vector<std::string>>("vetoTriggers",vetoTriggers_); // hide triggers with these filters
   checkFilters_      = iConfig.getUntrackedParameter<std::vector<std::string>>("checkFilters",checkFilters_); // highlight these filters
   ignoreFilters_     = iConfig.getUntrackedParameter<std::vector<std::string>>("ignoreFilters",ignoreFilters_); // hide these filters
+  menuCacheDir_      = iConfig.getUntrackedParameter<std::string>("menuCacheDir",menuCacheDir_); // load & save menus here
+  cachedMenus_       = iConfig.getUntrackedParameter<std::vector<std::string>>("cachedMenus",cachedMenus_); // report these cached menus
+  outputJSON_        = iConfig.getUntrackedParameter<std::string>("outputJSON",outputJSON_); // write summary to JSON
+  countPaths_        = iConfig.getUntrackedParameter<bool>("countPaths",countPaths_); // count path accepts per run & lumi
+  if(countPaths_)
+    triggerBits_ = consumes<edm::TriggerResults>(edm::InputTag("TriggerResults","","HLT"));
   trigTables_["All"] = { };
   
-  preparePatterns(triggers_,"_v");
-  preparePatterns(vetoTriggers_,"_v");
-  preparePatterns(filters_,"");
-  preparePatterns(checkFilters_,"");
-  preparePatterns(ignoreFilters_,"");
+  
+  // COMPILE PATTERNS once
+  triggerMatcher_      = PatternMatcher(triggers_,"_v");
+  vetoTriggerMatcher_  = PatternMatcher(vetoTriggers_,"_v");
+  filterMatcher_       = PatternMatcher(filters_);
+  checkFilterMatcher_  = PatternMatcher(checkFilters_);
+  ignoreFilterMatcher_ = PatternMatcher(ignoreFilters_);
+}
+
+
+void TriggerChecks::beginJob(){
+  // REPORT CACHED MENUS without data
+  for(auto const& tableName: cachedMenus_){
+    MenuData menu;
+    if(loadMenu(menu,tableName,"HLT")){
+      std::cout << ">>> Loaded cached HLT menu '\e[1m" << tableName << "\e[0m'" << std::endl;
+      std::cout << ">>>   Global tag:    '\e[1m" << menu.globalTag << "\e[0m'" << std::endl;
+      processMenu(menu,menu.globalTag);
+    }else{
+      std::cerr << ">>> Warning! No cached HLT menu '" << tableName << "' in '" << menuCacheDir_ << "'" << std::endl;
+    }
+  }
 }
 
 
@@ -121,61 +261,24 @@ void TriggerChecks::beginRun(const edm::Run& iRun, const edm::EventSetup& iSetup
         std::cout << ">>> HLT config extraction succeeded with process name '" << process << "'" << std::endl;
         std::cout << ">>>   HLT menu name: '\e[1m" << tableName << "\e[0m'" << std::endl;
         std::cout << ">>>   Global tag:    '\e[1m" << globalTag << "\e[0m'" << std::endl;
-        if(std::find(globalTags_.begin(),globalTags_.end(),globalTag)==globalTags_.end())
-          globalTags_.push_back(globalTag);
-        trigTables_[globalTag].insert(tableName);
         
-        // GET TRIGGERS & FILTERS
-        std::map<std::string,std::set<std::string>> trigFilters;
-        const std::vector<std::string>& trignames = hltConfig_.triggerNames();
-        for(auto const& trigname: trignames){
-          if(!selectTrigger(trigname)) continue;
-          if(vetoTrigger(trigname)) continue;
-          if(verbose_) std::cout << ">>>   \e[1m" << trigname << "\e[0m" << std::endl;
-          std::vector<std::string> filters = hltConfig_.moduleLabels(trigname);
-          std::string shortname  = removeVersionLabel(trigname);
-          bool selectedFilter = filters_.empty(); //false;
-          if(checkFilters_.size()>0){
-            for(auto const& filter: filters){
-              if(selectFilter(filter))
-                selectedFilter = true;
-              else
-                continue;
-              if(checkFilter(filter) and !ignoreFilter(filter)){ // highlight filter
-                std::string type = getTypelabel(filter);
-                if(verbose_) std::cout << ">>>     \e[1m" << filter << " " << type << "\e[0m" << std::endl;
-                std::string newfilter = "-> "+filter+" "+type;
-                trigFilters[shortname].insert(newfilter);
-                trigFilters_["All"][shortname].insert(newfilter);
-              }else if(verbose_){
-                std::string type = getTypelabel(filter);
-                std::cout << ">>>     " << filter << " " << type << std::endl;
-              }
-            }
-          }else if(verbose_){
-            for(auto const& filter: filters) std::cout << ">>>     " << filter << std::endl;
-          }
-          if(!selectedFilter) continue;
-          if(int(filters.size())>=nlast_+1){
-            for(int i=nlast_; i>=1; i--){
-              std::string lastfilter = filters[filters.size()-i-1];
-              if(nlast_>1) lastfilter = std::to_string(nlast_-i+1)+") "+lastfilter;
-              trigFilters[shortname].insert(lastfilter);
-              trigFilters_["All"][shortname].insert(lastfilter);
-            }
-          }else{
-            std::cerr << ">>>   Warning! Filter list has only " << filters.size() << "<" << std::to_string(nlast_+1) << " elements!" << std::endl;
-            break;
-          }
-          //for(auto const& filter: filters)
-          //  std::cout << ">>>     " << filter << std::endl;
-          //std::vector<std::string> filters2 = hltConfig_.saveTagsModules(trigname); // only modules saved in TriggerEvent
-          //for(auto const& filter2: filters2)
-          //  std::cout << ">>>     " << filter2 << std::endl;
+        // GET TRIGGERS & FILTERS from cache, or from HLT config
+        MenuData menu;
+        if(loadMenu(menu,tableName,process)){
+          std::cout << ">>>   Using cached menu '" << menuCacheFile(tableName,process) << "'" << std::endl;
+        }else{
+          menu.tableName = tableName;
+          menu.process   = process;
+          menu.globalTag = globalTag;
+          extractMenu(menu);
+          saveMenu(menu);
         }
-        trigFilters_[globalTag] = trigFilters;
+        processMenu(menu,globalTag);
+        if(countPaths_) resolvePaths(iRun.run());
+        
       }else{
         std::cout << ">>>   Trigger menu did not change. Skipping..." << std::endl;
+        if(countPaths_) availablePaths_[iRun.run()] = availablePaths_[lastLumi_.first];
       }
     }else{
       std::cerr << ">>> HLT config extraction failure with process name '" << process << "'" << std::endl;
@@ -183,6 +286,147 @@ void TriggerChecks::beginRun(const edm::Run& iRun, const edm::EventSetup& iSetup
 }
 
 
+void TriggerChecks::extractMenu(MenuData& menu){
+  // extract all paths with ordered module labels and types from the current HLT config
+  moduleTypes_.clear();
+  const std::vector<std::string>& trignames = hltConfig_.triggerNames();
+  menu.paths.reserve(trignames.size());
+  for(auto const& trigname: trignames){
+    const std::vector<std::string>& modules = hltConfig_.moduleLabels(trigname);
+    MenuData::Modules modtypes;
+    modtypes.reserve(modules.size());
+    for(auto const& module: modules)
+      modtypes.emplace_back(module,getModuleType(module));
+    menu.paths.emplace_back(trigname,modtypes);
+  }
+}
+
+
+void TriggerChecks::processMenu(const MenuData& menu, const std::string& globalTag){
+  if(std::find(globalTags_.begin(),globalTags_.end(),globalTag)==globalTags_.end())
+    globalTags_.push_back(globalTag);
+  trigTables_[globalTag].insert(menu.tableName);
+  
+  // SELECT TRIGGERS & FILTERS
+  std::map<std::string,std::set<std::string>> trigFilters;
+  for(auto const& path: menu.paths){
+    const std::string& trigname = path.first;
+    const MenuData::Modules& filters = path.second;
+    if(!selectTrigger(trigname)) continue;
+    if(vetoTrigger(trigname)) continue;
+    if(verbose_) std::cout << ">>>   \e[1m" << trigname << "\e[0m" << std::endl;
+    std::string shortname  = removeVersionLabel(trigname);
+    bool selectedFilter = filters_.empty(); //false;
+    if(checkFilters_.size()>0){
+      for(auto const& filter: filters){
+        if(selectFilter(filter.first))
+          selectedFilter = true;
+        else
+          continue;
+        if(checkFilter(filter.first) and !ignoreFilter(filter.first)){ // highlight filter
+          std::string type = getTypelabel(filter.second);
+          if(verbose_) std::cout << ">>>     \e[1m" << filter.first << " " << type << "\e[0m" << std::endl;
+          std::string newfilter = "-> "+filter.first+" "+type;
+          trigFilters[shortname].insert(newfilter);
+          trigFilters_["All"][shortname].insert(newfilter);
+          checkedFilters_[globalTag][shortname][filter.first] = type;
+        }else if(verbose_){
+          std::string type = getTypelabel(filter.second);
+          std::cout << ">>>     " << filter.first << " " << type << std::endl;
+        }
+      }
+    }else if(verbose_){
+      for(auto const& filter: filters) std::cout << ">>>     " << filter.first << std::endl;
+    }
+    if(!selectedFilter) continue;
+    if(int(filters.size())>=nlast_+1){
+      std::vector<std::string>& lastfilters = lastFilters_[globalTag][shortname];
+      for(int i=nlast_; i>=1; i--){
+        std::string lastfilter = filters[filters.size()-i-1].first;
+        if(std::find(lastfilters.begin(),lastfilters.end(),lastfilter)==lastfilters.end())
+          lastfilters.push_back(lastfilter);
+        if(nlast_>1) lastfilter = std::to_string(nlast_-i+1)+") "+lastfilter;
+        trigFilters[shortname].insert(lastfilter);
+        trigFilters_["All"][shortname].insert(lastfilter);
+      }
+    }else{
+      std::cerr << ">>>   Warning! Filter list has only " << filters.size() << "<" << std::to_string(nlast_+1) << " elements!" << std::endl;
+      break;
+    }
+  }
+  trigFilters_[globalTag] = trigFilters;
+}
+
+
+std::string TriggerChecks::menuCacheFile(const std::string& tableName, const std::string& process){
+  // cache file name from menu name (e.g. "/cdaq/physics/Run2018/2e34/v3.6.1/HLT/V2") and process
+  std::string name = tableName+"__"+process;
+  for(auto& c: name){
+    if(!std::isalnum(c) and c!='.' and c!='-' and c!='_') c = '_';
+  }
+  return menuCacheDir_+"/"+name+".txt";
+}
+
+
+bool TriggerChecks::loadMenu(MenuData& menu, const std::string& tableName, const std::string& process){
+  // text file with lines "key value", and a "module label type" line for each module of the last path
+  if(menuCacheDir_.empty()) return false;
+  std::ifstream file(menuCacheFile(tableName,process));
+  if(!file.is_open()) return false;
+  std::string line, key, label, type;
+  while(std::getline(file,line)){
+    std::istringstream fields(line);
+    key.clear(); label.clear(); type.clear();
+    if(!(fields >> key) or key[0]=='#') continue;
+    if(key=="path"){
+      fields >> label;
+      menu.paths.emplace_back(label,MenuData::Modules());
+    }else if(key=="module" and !menu.paths.empty()){
+      fields >> label >> type;
+      menu.paths.back().second.emplace_back(label,type);
+    }else if(key=="tableName"){
+      fields >> menu.tableName;
+    }else if(key=="process"){
+      fields >> menu.process;
+    }else if(key=="globalTag"){
+      fields >> menu.globalTag;
+    }
+  }
+  if(menu.tableName!=tableName or menu.process!=process){
+    std::cerr << ">>> Warning! Cached menu '" << menuCacheFile(tableName,process) << "' does not match '"
+              << tableName << "' (" << process << "), ignoring..." << std::endl;
+    menu = MenuData();
+    return false;
+  }
+  return true;
+}
+
+
+void TriggerChecks::saveMenu(const MenuData& menu){
+  if(menuCacheDir_.empty()) return;
+  mkdir(menuCacheDir_.c_str(),0755); // may already exist
+  std::string filename = menuCacheFile(menu.tableName,menu.process);
+  std::string tmpname  = filename+".tmp";
+  std::ofstream file(tmpname);
+  if(!file.is_open()){
+    std::cerr << ">>> Warning! Could not write menu cache '" << filename << "'" << std::endl;
+    return;
+  }
+  file << "# TriggerChecks menu cache" << std::endl;
+  file << "tableName " << menu.tableName << std::endl;
+  file << "process "   << menu.process   << std::endl;
+  file << "globalTag " << menu.globalTag << std::endl;
+  for(auto const& path: menu.paths){
+    file << "path " << path.first << "\n";
+    for(auto const& module: path.second)
+      file << "module " << module.first << " " << module.second << "\n";
+  }
+  file.close();
+  std::rename(tmpname.c_str(),filename.c_str()); // do not leave partial files for concurrent jobs
+  std::cout << ">>>   Saved menu to cache '" << filename << "'" << std::endl;
+}
+
+
 void TriggerChecks::endJob(){
   //std::cout << ">>> endJob()" << std::endl;
   
@@ -216,91 +460,256 @@ void TriggerChecks::endJob(){
     std::cout << "  " << std::string(92,'*') << std::endl;
   }
   
+  // PATH ACCEPTS PER RUN
+  if(countPaths_)
+    printCounts();
+  
+  if(!outputJSON_.empty())
+    writeJSON(outputJSON_);
+  
+}
+
+
+std::string jsonString(const std::string& str){
+  // quote and escape string for JSON
+  std::string quoted = "\"";
+  for(char c: str){
+    if(c=='"' or c=='\\'){
+      quoted += '\\'; quoted += c;
+    }else if(static_cast<unsigned char>(c)<0x20){
+      char buffer[8];
+      std::snprintf(buffer,sizeof(buffer),"\\u%04x",c);
+      quoted += buffer;
+    }else{
+      quoted += c;
+    }
+  }
+  return quoted+"\"";
+}
+
+
+template<typename T>
+std::string jsonList(const T& strings){
+  std::string list = "[";
+  for(auto it=strings.begin(); it!=strings.end(); ++it)
+    list += (it==strings.begin() ? "" : ", ")+jsonString(*it);
+  return list+"]";
+}
+
+
+void TriggerChecks::writeJSON(const std::string& filename){
+  // machine-readable summary:
+  //   'globalTags'     -> list of global tags in order of appearance
+  //   'menus'          -> global tag -> list of HLT menu names
+  //   'filters'        -> global tag -> path -> list of filters as in the printed summary
+  //   'lastFilters'    -> global tag -> path -> ordered list of last filters
+  //   'checkedFilters' -> global tag -> path -> highlighted filter -> type label
+  //   'pathCounts'     -> 'paths': list of counted paths,
+  //                       'available': run -> list of paths in menu,
+  //                       'lumis': list of [ run, lumi, events, [ accepts per path ] ]
+  std::ofstream file(filename);
+  if(!file.is_open()){
+    std::cerr << ">>> Warning! Could not write JSON file '" << filename << "'" << std::endl;
+    return;
+  }
+  file << "{\n  \"globalTags\": " << jsonList(globalTags_) << ",\n";
+  file << "  \"menus\": {";
+  for(std::size_t i=0; i<globalTags_.size(); ++i)
+    file << (i ? "," : "") << "\n    " << jsonString(globalTags_[i]) << ": " << jsonList(trigTables_[globalTags_[i]]);
+  file << "\n  },\n  \"filters\": {";
+  for(std::size_t i=0; i<globalTags_.size(); ++i){
+    const auto& paths = trigFilters_[globalTags_[i]];
+    file << (i ? "," : "") << "\n    " << jsonString(globalTags_[i]) << ": {";
+    for(auto it=paths.begin(); it!=paths.end(); ++it)
+      file << (it==paths.begin() ? "" : ",") << "\n      " << jsonString(it->first) << ": " << jsonList(it->second);
+    file << "\n    }";
+  }
+  file << "\n  },\n  \"lastFilters\": {";
+  for(std::size_t i=0; i<globalTags_.size(); ++i){
+    const auto& paths = lastFilters_[globalTags_[i]];
+    file << (i ? "," : "") << "\n    " << jsonString(globalTags_[i]) << ": {";
+    for(auto it=paths.begin(); it!=paths.end(); ++it)
+      file << (it==paths.begin() ? "" : ",") << "\n      " << jsonString(it->first) << ": " << jsonList(it->second);
+    file << "\n    }";
+  }
+  file << "\n  },\n  \"checkedFilters\": {";
+  for(std::size_t i=0; i<globalTags_.size(); ++i){
+    const auto& paths = checkedFilters_[globalTags_[i]];
+    file << (i ? "," : "") << "\n    " << jsonString(globalTags_[i]) << ": {";
+    for(auto it=paths.begin(); it!=paths.end(); ++it){
+      file << (it==paths.begin() ? "" : ",") << "\n      " << jsonString(it->first) << ": {";
+      for(auto jt=it->second.begin(); jt!=it->second.end(); ++jt)
+        file << (jt==it->second.begin() ? "" : ", ") << jsonString(jt->first) << ": " << jsonString(jt->second);
+      file << "}";
+    }
+    file << "\n    }";
+  }
+  file << "\n  }";
+  if(countPaths_){
+    file << ",\n  \"pathCounts\": {\n    \"paths\": " << jsonList(countPaths_names_) << ",\n    \"available\": {";
+    for(auto it=availablePaths_.begin(); it!=availablePaths_.end(); ++it){
+      std::vector<std::string> paths;
+      for(std::size_t i=0; i<it->second.size(); ++i)
+        if(it->second[i]) paths.push_back(countPaths_names_[i]);
+      file << (it==availablePaths_.begin() ? "" : ",") << "\n      \"" << it->first << "\": " << jsonList(paths);
+    }
+    file << "\n    },\n    \"lumis\": [";
+    for(auto it=lumiCounts_.begin(); it!=lumiCounts_.end(); ++it){
+      file << (it==lumiCounts_.begin() ? "" : ",") << "\n      [" << it->first.first << ", " << it->first.second
+           << ", " << it->second[0] << ", [";
+      for(std::size_t i=0; i<countPaths_names_.size(); ++i)
+        file << (i ? ", " : "") << (i+1<it->second.size() ? it->second[i+1] : 0);
+      file << "]]";
+    }
+    file << "\n    ]\n  }";
+  }
+  file << "\n}\n";
+  file.close();
+  std::cout << ">>> Written summary to '" << filename << "'" << std::endl;
 }
 
 
 void TriggerChecks::analyze(const edm::Event& iEvent, const edm::EventSetup& iSetup){
-  //edm::Handle<edm::TriggerResults> triggerBits;
-  //iEvent.getByToken(triggerBits_,triggerBits);
-  //const edm::TriggerNames &names = iEvent.triggerNames(*triggerBits);
-  //for(unsigned int i=0, n=triggerBits->size(); i<n; ++i){
-  //  if(selectTrigger(names.triggerName(i))){
-  //    std::cout << ">>>   " << names.triggerName(i) << std::endl;
-  //  }
-  //}
+  if(!countPaths_) return;
+  edm::Handle<edm::TriggerResults> triggerBits;
+  iEvent.getByToken(triggerBits_,triggerBits);
+  if(!triggerBits.isValid()) return;
+  std::vector<uint64_t>& counts = getCounts(iEvent.id().run(),iEvent.id().luminosityBlock());
+  counts[0]++; // events
+  const unsigned int ntrigs = triggerBits->size();
+  for(std::size_t i=0; i<countIndices_.size(); ++i){
+    if(countIndices_[i]<ntrigs and triggerBits->accept(countIndices_[i]))
+      counts[countColumns_[i]+1]++;
+  }
 }
 
 
-std::string TriggerChecks::getTypelabel(const std::string& filter){
-  std::string type = hltConfig_.moduleEDMType(filter);
-  if(type=="EDFilter"){
-    return "(F)";
-  }else if(type=="EDProducer"){
-    return "(P)";
+void TriggerChecks::resolvePaths(unsigned int run){
+  // resolve trigger indices of selected paths once per menu
+  countIndices_.clear();
+  countColumns_.clear();
+  const std::vector<std::string>& trignames = hltConfig_.triggerNames();
+  for(unsigned int i=0; i<trignames.size(); ++i){
+    if(!selectTrigger(trignames[i])) continue;
+    if(vetoTrigger(trignames[i])) continue;
+    std::string shortname = removeVersionLabel(trignames[i]);
+    auto it = countPaths_columns_.find(shortname);
+    if(it==countPaths_columns_.end()){
+      it = countPaths_columns_.emplace(shortname,countPaths_names_.size()).first;
+      countPaths_names_.push_back(shortname);
+    }
+    countIndices_.push_back(i);
+    countColumns_.push_back(it->second);
   }
-  return "("+type+")";
+  std::vector<bool>& available = availablePaths_[run];
+  available.assign(countPaths_names_.size(),false);
+  for(auto const& column: countColumns_)
+    available[column] = true;
+  lastLumi_   = {run,0};
+  lastCounts_ = nullptr; // number of columns may have changed
 }
 
 
+std::vector<uint64_t>& TriggerChecks::getCounts(unsigned int run, unsigned int lumi){
+  // flat array of counts for this lumi section, cached for consecutive events
+  if(lastCounts_ and lastLumi_.first==run and lastLumi_.second==lumi)
+    return *lastCounts_;
+  std::vector<uint64_t>& counts = lumiCounts_[{run,lumi}];
+  if(counts.size()<countPaths_names_.size()+1)
+    counts.resize(countPaths_names_.size()+1,0);
+  lastLumi_   = {run,lumi};
+  lastCounts_ = &counts;
+  return counts;
+}
+
 
-bool TriggerChecks::select(const std::string& path, const std::vector<std::string> patterns){
-  //if(!patterns) return true;
-  for(auto const& pattern: patterns){
-    if(pattern.find("*")!=std::string::npos){
-      std::smatch match;
-      std::regex patternregexp(pattern);
-      if(std::regex_search(path,match,patternregexp)) return true;
-    }else{
-      if(path.find(pattern)!=std::string::npos) return true;
+void TriggerChecks::printCounts(){
+  // sum lumi sections per run
+  std::map<unsigned int,std::vector<uint64_t>> runCounts;
+  for(auto const& lumi: lumiCounts_){
+    std::vector<uint64_t>& counts = runCounts[lumi.first.first];
+    counts.resize(countPaths_names_.size()+1,0);
+    for(std::size_t i=0; i<lumi.second.size(); ++i)
+      counts[i] += lumi.second[i];
+  }
+  std::cout << "\n  " << std::string(4,'*') << " Summary of path accepts per run "
+                      << std::string(55,'*') << std::endl;
+  for(auto const& run: runCounts){
+    const std::vector<bool>& available = availablePaths_[run.first];
+    uint64_t nevents = run.second[0];
+    std::cout << "  *" << std::setw(90) << " " << "*" << std::endl;
+    std::cout << "  *   \e[1m" << std::left << std::setw(87) << ("Run "+std::to_string(run.first)+": "+
+                 std::to_string(nevents)+" events") << "\e[0m*" << std::endl;
+    for(std::size_t i=0; i<countPaths_names_.size(); ++i){
+      std::ostringstream line;
+      line << std::left << std::setw(66) << countPaths_names_[i] << std::right;
+      if(i<available.size() and available[i])
+        line << std::setw(10) << run.second[i+1] << std::setw(8) << std::fixed << std::setprecision(2)
+             << (nevents>0 ? 100.0*run.second[i+1]/nevents : 0.0) << "%";
+      else
+        line << std::setw(19) << "not in menu";
+      std::cout << "  *     " << std::left << std::setw(85) << line.str() << "*" << std::endl;
     }
   }
-  return false;
+  std::cout << "  *" << std::setw(90) << " " << "*" << std::endl;
+  std::cout << "  " << std::string(92,'*') << std::endl;
+}
+
+
+std::string TriggerChecks::getModuleType(const std::string& module){
+  // memoize, as modules are shared between many paths
+  auto it = moduleTypes_.find(module);
+  if(it!=moduleTypes_.end()) return it->second;
+  std::string type = hltConfig_.moduleEDMType(module);
+  moduleTypes_[module] = type;
+  return type;
+}
+
+
+std::string TriggerChecks::getTypelabel(const std::string& type){
+  if(type=="EDFilter"){
+    return "(F)";
+  }else if(type=="EDProducer"){
+    return "(P)";
+  }
+  return "("+type+")";
 }
 
 
 bool TriggerChecks::selectTrigger(const std::string& path){
-  if(triggers_.empty()) return true;
-  bool selected = select(path,triggers_);
-  return selected;
+  if(triggerMatcher_.empty()) return true;
+  return triggerMatcher_.match(path);
 }
 
 
 bool TriggerChecks::selectFilter(const std::string& path){ // for selecting
-  if(filters_.empty()) return true;
-  bool selected = select(path,filters_);
-  return selected;
+  if(filterMatcher_.empty()) return true;
+  return filterMatcher_.match(path);
 }
 
 
 bool TriggerChecks::vetoTrigger(const std::string& path){
-  bool veto = select(path,vetoTriggers_);
-  return veto;
+  return vetoTriggerMatcher_.match(path);
 }
 
 
 bool TriggerChecks::checkFilter(const std::string& path){ // for highlighting
-  bool selected = select(path,checkFilters_);
-  return selected;
+  return checkFilterMatcher_.match(path);
 }
 
 
 bool TriggerChecks::ignoreFilter(const std::string& path){ // ignore for highlighting
-  bool veto = select(path,ignoreFilters_);
-  return veto;
+  return ignoreFilterMatcher_.match(path);
 }
 
 
 std::string TriggerChecks::removeVersionLabel(const std::string& path){
-  std::regex pattern("_v\\d+$");
-  std::string newpath = std::regex_replace(path,pattern,"");
-  return newpath;
-}
-
-
-void TriggerChecks::preparePatterns(std::vector<std::string>& patterns, const std::string tag){
-  std::regex wilcardexp("\\*");
-  for(std::size_t i=0; i<patterns.size(); ++i)
-    patterns[i] = std::regex_replace(patterns[i],wilcardexp,".*")+tag;
+  // strip trailing "_v\d+"
+  std::size_t end = path.size();
+  while(end>0 and std::isdigit(path[end-1])) end--;
+  if(end<path.size() and end>=2 and path.compare(end-2,2,"_v")==0)
+    return path.substr(0,end-2);
+  return path;
 }
 
 
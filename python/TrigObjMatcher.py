@@ -6,8 +6,11 @@
 #   https://cms-nanoaod-integration.web.cern.ch/integration/master-106X/mc106X_doc.html#TrigObj
 import os, sys, yaml #, json
 from utils import bold
+import numpy as np
 from collections import namedtuple
 from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Collection
+from branchReader import deltaR
+from triggerExpr import parseExpr, evaluateTree
 TriggerData = namedtuple('TriggerData',['trigdict','combdict']) # simple container class
 objectTypes = { 1: 'Jet', 6: 'FatJet', 2: 'MET', 3: 'HT', 4: 'MHT',
                 11: 'Electron', 13: 'Muon', 15: 'Tau', 22: 'Photon', } 
@@ -130,6 +133,7 @@ class Trigger:
         self.runrange = runrange                            # range of run for this trigger formatted as (first,last); for data only
         self.path     = path                                # human readable trigger combination
         self.patheval = patheval                            # trigger evaluation per event 'e'
+        self.expr     = parseExpr(patheval)                 # expression tree, to evaluate on arrays of events
         self.fireddef = "self.fired = lambda e: "+patheval  # exact definition of 'fired' function
         exec self.fireddef in locals()                      # method to check if trigger was fired for a given event
         #self.fired = lambda e: any(e.p for p in self.paths)
@@ -274,6 +278,7 @@ class TrigObjMatcher:
         self.bits     = bits           # bitwise 'OR'-combination of all filter bits
         self.path     = path           # human readable trigger combination
         self.patheval = patheval       # trigger evaluation per event 'e'
+        self.expr     = parseExpr(patheval) # expression tree, to evaluate on arrays of events
         self.fireddef = firedef        # exact definition of 'fired' function
         exec self.fireddef in locals() # method to check if any of the triggers was fired for a given event
         
@@ -291,6 +296,10 @@ class TrigObjMatcher:
           for i, filter in enumerate(trigger.filters,1):
             print "%s  leg %d: %s, %r"%(indent,i,filter.type,filter.name)
         
+    def firedTriggers(self,event):
+        """Evaluate each trigger once for this event, and return the list of those that fired."""
+        return [t for t in self.triggers if t.fired(event)]
+        
     def match(self,event,recoObj,leg=1,dR=0.2):
         """Match given reconstructed object to trigger objects."""
         leg     -= 1 # index starting at 0
@@ -301,5 +310,196 @@ class TrigObjMatcher:
             if trigger.filters[leg].matchbits(trigObj) and trigger.filters[leg].match(trigObj,recoObj,dR=dR):
               return trigObj
         return None
+        
+    def matchAll(self,event,recoObjs,leg=1,dR=0.2,trigObjs=None,fired=None):
+        """Match a list of reconstructed objects to trigger objects in one go.
+        The trigger objects are selected and the triggers are evaluated only once per call,
+        instead of once per reconstructed object. A list of trigger objects (e.g. from
+        Collection(event,'TrigObj')) can be passed to avoid reading it again, and a list of
+        the fired triggers (see firedTriggers) to avoid evaluating them again.
+        Returns a list with the matched trigger object (or None) for each reconstructed object."""
+        leg     -= 1 # index starting at 0
+        matches  = [None]*len(recoObjs)
+        if trigObjs==None:
+          trigObjs = Collection(event,'TrigObj')
+        trigObjs = [o for o in trigObjs if o.id==self.ids[leg]]
+        if not trigObjs or not recoObjs:
+          return matches
+        if fired==None:
+          fired = self.firedTriggers(event)
+        for trigger in fired:
+          filter = trigger.filters[leg]
+          legObjs = [o for o in trigObjs if filter.matchbits(o)]
+          for i, recoObj in enumerate(recoObjs):
+            if matches[i]!=None: continue # already matched by an earlier trigger
+            for trigObj in legObjs:
+              if filter.match(trigObj,recoObj,dR=dR):
+                matches[i] = trigObj
+                break
+        return matches
+        
+    def matchArrays(self,event,trigObjs,pt,eta,phi,leg=1,dR=0.2):
+        """Match arrays of reconstructed objects to trigger objects, like matchAll, but vectorized
+        over the arrays of a NanoArrayReader (see branchReader.py), without per-object wrappers.
+        trigObjs is a dictionary with the 'id', 'filterBits', 'eta' and 'phi' arrays of TrigObj.
+        Returns an array with the index of the matched trigger object (or -1) for each reconstructed object."""
+        leg     -= 1 # index starting at 0
+        matches  = np.full(len(eta),-1,dtype=np.int32)
+        indices  = np.nonzero(trigObjs['id']==self.ids[leg])[0]
+        if not len(indices) or not len(eta):
+          return matches
+        bits     = trigObjs['filterBits'][indices]
+        pt       = np.asarray(pt,dtype=np.float64) # compare cuts in double precision like Object does
+        eta      = np.asarray(eta,dtype=np.float64)
+        close    = deltaR(trigObjs['eta'][indices],trigObjs['phi'][indices],eta,phi).T<dR # reco x trigger objects
+        for trigger in self.triggers:
+          if not trigger.fired(event): continue
+          filter = trigger.filters[leg]
+          passed = close & ((bits&filter.bits)==filter.bits)
+          passed[(pt<=filter.ptmin) | (np.abs(eta)>=filter.etamax)] = False
+          new    = (matches<0) & passed.any(axis=1) # not matched by an earlier trigger
+          matches[new] = indices[passed[new].argmax(axis=1)] # first matching trigger object
+        return matches
+        
+
+
+class TrigObjMatcherBank:
+    """Match reconstructed objects to the trigger objects of several channels (TrigObjMatcher) at once.
+    Each unique (trigger, leg) gets one bit in a mask. Per event, the fired triggers are evaluated once,
+    trigger objects are preselected with the union of all filter bits for their object ID,
+    and DeltaR is computed once per (reco object, trigger object) pair. The matched flags
+    of each channel and leg then follow from bitwise ANDs of the masks.
+    Channels whose triggers did not fire are skipped up front."""
+    
+    def __init__(self,matchers,channels=None,dR=0.2):
+        """matchers: dictionary of channel -> TrigObjMatcher."""
+        if channels==None:
+          channels = sorted(matchers.keys())
+        slots     = [ ] # (trigger, leg, filter) per bit
+        slotdict  = { } # (trigger, leg) -> bit
+        legmasks  = { } # (channel, leg) -> mask of bits
+        legids    = { } # (channel, leg) -> object ID
+        chanmasks = { } # channel -> mask of bits
+        for channel in channels:
+          matcher = matchers[channel]
+          chanmasks[channel] = 0
+          for trigger in matcher.triggers:
+            for leg, filter in enumerate(trigger.filters,1):
+              key = (trigger,leg)
+              if key not in slotdict:
+                slotdict[key] = len(slots)
+                slots.append((trigger,leg,filter))
+              bit = 1<<slotdict[key]
+              legmasks[(channel,leg)] = legmasks.get((channel,leg),0) | bit
+              legids[(channel,leg)]   = filter.id
+              chanmasks[channel]     |= bit
+        if len(slots)>64:
+          raise IOError("Too many (trigger, leg) combinations for a 64-bit mask: %d"%(len(slots)))
+        trigmasks = [ ] # (trigger, mask of its bits), one per unique trigger
+        for trigger in set(t for t, l, f in slots):
+          trigmasks.append((trigger,sum(1<<i for i, (t,l,f) in enumerate(slots) if t==trigger)))
+        trigmasks.sort(key=lambda t: t[0].path)
+        idmasks   = { } # object ID -> mask of bits
+        unionbits = { } # object ID -> bitwise 'OR' of the filter bits
+        anybits   = { } # object ID -> all filters require some bits
+        for i, (trigger,leg,filter) in enumerate(slots):
+          idmasks[filter.id]   = idmasks.get(filter.id,0) | (1<<i)
+          unionbits[filter.id] = unionbits.get(filter.id,0) | filter.bits
+          anybits[filter.id]   = anybits.get(filter.id,True) and filter.bits>0
+        
+        self.channels  = channels  # list of channels
+        self.matchers  = matchers  # dictionary of channel -> TrigObjMatcher
+        self.dR        = dR        # maximum DeltaR
+        self.slots     = slots     # list of (trigger, leg, filter), one per bit
+        self.legmasks  = legmasks  # (channel, leg) -> mask of bits
+        self.legids    = legids    # (channel, leg) -> object ID
+        self.chanmasks = chanmasks # channel -> mask of bits
+        self.trigmasks = trigmasks # list of (trigger, mask of bits)
+        self.idmasks   = idmasks   # object ID -> mask of bits
+        self.unionbits = unionbits # object ID -> union of filter bits
+        self.anybits   = anybits   # object ID -> whether trigger objects without any of the union bits can be skipped
+        self.firedmask = 0         # mask of bits of fired triggers in the current event
+        self.decisions = None      # trigger path -> array of precomputed decisions per entry (optional)
+        self.ndecided  = 0         # number of entries with precomputed decisions
+        
+    def __repr__(self):
+        """Returns string representation of TrigObjMatcherBank object."""
+        return "<%s(%s) at %s>"%(self.__class__.__name__,', '.join(self.channels),hex(id(self)))
+        
+    def evaluate(self,tree,chunksize=100000,nmax=-1):
+        """Precompute the decisions of all triggers for the first nmax entries (-1 for all) of a tree,
+        per chunk of events with numpy (see triggerExpr.py), so fire only needs to look them up."""
+        exprs = { t.path: t.expr for t, m in self.trigmasks }
+        self.decisions = evaluateTree(tree,exprs,chunksize=chunksize,nmax=nmax)
+        self.ndecided  = min(len(d) for d in self.decisions.itervalues()) if self.decisions else 0
+        return self.decisions
+        
+    def fire(self,event):
+        """Evaluate each trigger once for this event, or look up the precomputed decisions (see evaluate).
+        Returns a dictionary of channel -> whether any of its triggers fired."""
+        mask  = 0
+        entry = event._entry
+        if self.decisions!=None and entry<self.ndecided: # else evaluate per event
+          for trigger, trigmask in self.trigmasks:
+            if self.decisions[trigger.path][entry]:
+              mask |= trigmask
+        else:
+          for trigger, trigmask in self.trigmasks:
+            if trigger.fired(event):
+              mask |= trigmask
+        self.firedmask = mask
+        return { c: (mask&m)!=0 for c, m in self.chanmasks.iteritems() }
+        
+    def matchArrays(self,trigObjs,recoObjs,id):
+        """Match arrays of reconstructed objects with some object ID to the trigger objects of all channels,
+        for the triggers that fired (see fire). trigObjs and recoObjs are dictionaries of arrays
+        from a NanoArrayReader (see branchReader.py), with 'id', 'filterBits', 'eta' and 'phi' for TrigObj,
+        and 'pt', 'eta' and 'phi' for the reconstructed objects.
+        Returns a dictionary of (channel, leg) -> array of matched flags for each leg with this object ID."""
+        keys    = [k for k in self.legmasks if self.legids[k]==id]
+        nobjs   = len(recoObjs['eta'])
+        flags   = { k: np.zeros(nobjs,dtype=bool) for k in keys }
+        active  = self.firedmask & self.idmasks.get(id,0)
+        if not active or not nobjs:
+          return flags
+        select  = trigObjs['id']==id
+        if self.anybits[id]:
+          select &= (trigObjs['filterBits']&self.unionbits[id])!=0
+        indices = np.nonzero(select)[0]
+        if not len(indices):
+          return flags
+        bits    = trigObjs['filterBits'][indices]
+        pt      = np.asarray(recoObjs['pt'],dtype=np.float64)
+        eta     = np.asarray(recoObjs['eta'],dtype=np.float64)
+        trigmasks = np.zeros(len(indices),dtype=np.uint64) # bits of filters passed by each trigger object
+        recomasks = np.zeros(nobjs,dtype=np.uint64)        # bits of offline cuts passed by each reco object
+        for i, (trigger,leg,filter) in enumerate(self.slots):
+          if not (active>>i)&1: continue
+          bit = np.uint64(1<<i)
+          trigmasks[(bits&filter.bits)==filter.bits] |= bit
+          recomasks[(pt>filter.ptmin) & (np.abs(eta)<filter.etamax)] |= bit
+        close   = deltaR(eta,recoObjs['phi'],trigObjs['eta'][indices],trigObjs['phi'][indices])<self.dR
+        masks   = np.bitwise_or.reduce(np.where(close,recomasks[:,None]&trigmasks[None,:],np.uint64(0)),axis=1)
+        for key in keys:
+          flags[key] = (masks&np.uint64(self.legmasks[key]))!=0
+        return flags
+        
+
+
+def matchLegs(event,legs,dR=0.2,fired=None):
+    """Match several combinations of (TrigObjMatcher, list of reconstructed objects, leg)
+    in one batch, reading the trigger object collection and evaluating the triggers of each matcher
+    only once per event. A dictionary of matcher -> list of fired triggers (see firedTriggers)
+    can be passed for matchers that were already evaluated.
+    Returns a list of matches (see TrigObjMatcher.matchAll) for each combination,
+    and the dictionary of matcher -> list of fired triggers."""
+    fired    = dict(fired or { })
+    trigObjs = [o for o in Collection(event,'TrigObj')]
+    matches  = [ ]
+    for matcher, recoObjs, leg in legs:
+      if matcher not in fired:
+        fired[matcher] = matcher.firedTriggers(event)
+      matches.append(matcher.matchAll(event,recoObjs,leg=leg,dR=dR,trigObjs=trigObjs,fired=fired[matcher]))
+    return matches, fired
     
 
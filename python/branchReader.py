@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+# Description: Read nanoAOD collections (TrigObj, Tau, ...) directly into preallocated numpy arrays,
+#              without creating a python object per particle
+import numpy as np
+from math import pi
+
+dtypes = { 'Float_t': np.float32, 'Double_t': np.float64, 'Int_t': np.int32, 'UInt_t': np.uint32,
+           'Short_t': np.int16, 'UShort_t': np.uint16, 'Char_t': np.int8, 'UChar_t': np.uint8,
+           'Bool_t': np.bool_, 'Long64_t': np.int64, 'ULong64_t': np.uint64, }
+
+
+def deltaR(eta1,phi1,eta2,phi2):
+  """Matrix of DeltaR between two arrays of objects (rows: first, columns: second),
+  computed like the DeltaR of nanoAOD-tools' Object."""
+  deta = np.subtract.outer(np.asarray(eta1,dtype=np.float64),np.asarray(eta2,dtype=np.float64))
+  dphi = np.subtract.outer(np.asarray(phi1,dtype=np.float64),np.asarray(phi2,dtype=np.float64))
+  dphi[dphi>pi]  -= 2*pi
+  dphi[dphi<-pi] += 2*pi
+  return np.sqrt(deta*deta+dphi*dphi)
+
+
+class NanoArrayReader:
+    """Bind the leaves of nanoAOD collections to preallocated numpy arrays with SetBranchAddress,
+    and read only those branches per entry. The buffers are reused for every entry, and get returns
+    views of the first n elements, so no copies or per-object wrappers are made.
+    Create it in Module.beginFile, before the collections are accessed in the event loop,
+    so that the TTreeReader of the post-processor reads into the same buffers."""
+
+    def __init__(self,tree,collections,verbose=False):
+        """collections: dictionary of collection name -> list of fields, e.g. { 'TrigObj': ['id','pt'] }."""
+        self.tree     = tree
+        self.counts   = { } # collection -> array of size one with the number of objects
+        self.arrays   = { } # collection -> field -> buffer
+        self.branches = [ ] # branches to read per entry
+        self.entry    = -1
+        for collection, fields in collections.iteritems():
+          countname = 'n'+collection
+          countleaf = tree.GetLeaf(countname)
+          if not countleaf:
+            raise KeyError("Did not find branch '%s' in tree '%s'!"%(countname,tree.GetName()))
+          count = np.zeros(1,dtype=dtypes[countleaf.GetTypeName()])
+          tree.SetBranchAddress(countname,count)
+          self.counts[collection] = count
+          self.branches.append(tree.GetBranch(countname))
+          self.arrays[collection] = { }
+          nmax = max(1,countleaf.GetMaximum()) # maximum number of objects in this tree
+          for field in fields:
+            name = "%s_%s"%(collection,field)
+            leaf = tree.GetLeaf(name)
+            if not leaf:
+              raise KeyError("Did not find branch '%s' in tree '%s'!"%(name,tree.GetName()))
+            array = np.zeros(nmax,dtype=dtypes[leaf.GetTypeName()])
+            tree.SetBranchAddress(name,array)
+            self.arrays[collection][field] = array
+            self.branches.append(tree.GetBranch(name))
+          if verbose:
+            print ">>> NanoArrayReader: bound %s (%s) with at most %d objects"%(collection,', '.join(fields),nmax)
+
+    def __repr__(self):
+        """Returns string representation of NanoArrayReader object."""
+        return "<%s(%s) at %s>"%(self.__class__.__name__,', '.join(self.arrays),hex(id(self)))
+
+    def read(self,entry):
+        """Read the bound branches of an entry, if not done yet."""
+        if entry!=self.entry:
+          for branch in self.branches:
+            branch.GetEntry(entry)
+          self.entry = entry
+        return self
+
+    def size(self,collection):
+        """Number of objects in a collection in the current entry."""
+        return int(self.counts[collection][0])
+
+    def get(self,collection,event=None):
+        """Get a dictionary of field -> array (view) of a collection for the current entry,
+        or for the entry of a nanoAOD-tools Event object."""
+        if event!=None:
+          self.read(event._entry)
+        n = self.size(collection)
+        return { f: a[:n] for f, a in self.arrays[collection].iteritems() }
+
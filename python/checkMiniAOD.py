@@ -12,12 +12,22 @@
 #  help(ROOT.pat.TriggerObjectStandAlone)
 from DataFormats.FWLite import Handle, Events
 from argparse import ArgumentParser
-from ROOT import gROOT
+from multiprocessing import Pool
+from filterPathStore import FilterPathCounts
+from ROOT import gROOT, edm
 #gROOT.Macro("getHLTConfigProvider.C+")
 
 parser = ArgumentParser()
 parser.add_argument('-n', '--nmax', dest='nmax', action='store', type=int, default=10,
-                                    help="maximum number of events")
+                                    help="maximum number of events (per file, -1 for all; ignored with -l)")
+parser.add_argument('-l', '--nperlumi', dest='nperlumi', action='store', type=int, default=0,
+                                        help="sample at most this number of events per (run, lumi), spread evenly through each file, instead of the first nmax")
+parser.add_argument('-c', '--check', dest='checks', nargs='+', choices=['taus','paths','objects'], default=['objects'],
+                                     help="checks to run in a single pass over each file")
+parser.add_argument('-j', '--ncores', dest='ncores', action='store', type=int, default=1,
+                                      help="number of parallel processes, each handling a subset of files")
+parser.add_argument('-s', '--store', dest='store', action='store', type=str, default=None,
+                                     help="save filter x path counts to this numpy file (.npz)")
 args = parser.parse_args()
 
 trigObjTypes = {
@@ -25,87 +35,212 @@ trigObjTypes = {
   85: 'jet', 86: 'bjet', 87: 'MET', 88: 'MET', 89: 'ak8jet', 90: 'ak8jet',
   91: 'track',
 }
-filters = { }
+filters = FilterPathCounts() # filter x path co-occurrences of trigger objects
 
-def checkTauObjects(filename,nmax):
-    print ">>> checkTauObjects: %s"%(filename)
-    taus, tauLabel = Handle("std::vector<pat::Tau>"), "slimmedTaus"
-    events = Events(filename)
-    for ievent, event in enumerate(events,1):
-      if ievent>nmax: break
-      print ">>> %s event %1d %s"%('-'*10,ievent,'-'*60)
-      event.getByLabel(tauLabel,taus)
-      for itau, tau in enumerate(taus.product()):
-        ###if tau.pt()<20: continue
-        #print "tau  %2d: pt %4.1f, dxy signif %.1f"%(itau,tau.pt(),tau.dxy_Sig())
-        print ">>>   tau  %2d: pt %4.1f, dxy signif %.1f, ID(byTightIsolationMVArun2v1DBoldDMwLT) %.1f, lead candidate pt %.1f, pdgId %d "%(
-                    itau,tau.pt(),tau.dxy_Sig(), tau.tauID("byTightIsolationMVArun2v1DBoldDMwLT"), tau.leadCand().pt(), tau.leadCand().pdgId())
-    print '-'*80
+# PRODUCTS: name -> (type, label)
+products = {
+  'taus':           ("std::vector<pat::Tau>",                     "slimmedTaus"),
+  'triggerBits':    ("edm::TriggerResults",                       "TriggerResults::HLT"),
+  'triggerObjects': ("std::vector<pat::TriggerObjectStandAlone>", "slimmedPatTrigger"),
+}
+handles = { } # reuse Handle objects over files and checks
+menus   = { } # cache of trigger menus: parameter set ID of TriggerResults -> TriggerMenu
+
+# CHECKS: name -> (title, products needed, print event header)
+checkdefs = {
+  'taus':    ("checkTauObjects",     ['taus'],                         True ),
+  'paths':   ("checkTriggerPaths",   ['triggerBits'],                  True ),
+  'objects': ("checkTriggerObjects", ['triggerBits','triggerObjects'], False),
+}
+
+# SETTINGS of checkTriggerPaths
+mypathnames   = ['HLT_IsoMu','HLT_Ele','PFTau']
+
+# SETTINGS of checkTriggerObjects
+mytrignames   = ['Tau'] #['Ele','IsoMu','Tau']
+mytrigfilters = [ ]
+mytrigtypes   = [84] #[82,83,84]
+ptmin         = 20
+
+
+def getHandle(product):
+    """Get Handle for a given product, creating it only once."""
+    if product not in handles:
+      handles[product] = Handle(products[product][0])
+    return handles[product]
     
 
+class TriggerMenu:
+    """Cache of the trigger names and per-path decisions for one HLT menu,
+    so the per-event work only consists of integer lookups."""
+    def __init__(self,event,triggerBits):
+      triggerNames      = event.object().triggerNames(triggerBits)
+      self.triggerNames = edm.TriggerNames(triggerNames) # keep own copy for unpacking
+      self.names        = [n for n in triggerNames.triggerNames()]
+      self.indices      = { n: i for i, n in enumerate(self.names) }
+      self.paths        = [(i,n) for i, n in enumerate(self.names) # paths of interest for checkTriggerPaths
+                           if 'HLT_' in n and any(p in n for p in mypathnames)]
+      self.taupaths     = set(n for n in self.names if isTauTrigger(n)) # memoized isTauTrigger decisions
+    
 
-def checkTriggerPaths(filename,nmax):
-    print ">>> checkTriggerPaths: %s"%(filename)
-    mytrignames = ['HLT_IsoMu','HLT_Ele','PFTau']
-    triggerBits, triggerBitLabel = Handle("edm::TriggerResults"), "TriggerResults::HLT"
-    events = Events(filename)
+def getTriggerMenu(event,triggerBits):
+    """Get cached trigger menu, keyed on the parameter set ID of the TriggerResults."""
+    psetid = triggerBits.parameterSetID().compactForm()
+    menu   = menus.get(psetid,None)
+    if menu==None:
+      menu = TriggerMenu(event,triggerBits)
+      menus[psetid] = menu
+    return menu
+    
+
+def sampleEvents(events,nperlumi):
+    """Select at most nperlumi event indices per (run, lumi), spread evenly over each lumi section,
+    to cover every run (and HLT menu) of a file with a minimal number of events.
+    Only the event auxiliary is read to build the (run, lumi) index."""
+    lumis = { }
+    for index in xrange(events.size()):
+      events.to(index)
+      aux = events.eventAuxiliary()
+      lumis.setdefault((aux.run(),aux.luminosityBlock()),[ ]).append(index)
+    indices = [ ]
+    for runlumi, lumiindices in lumis.iteritems():
+      nlumi = len(lumiindices)
+      step  = max(1.0,nlumi/float(nperlumi))
+      indices.extend(lumiindices[int(i*step)] for i in xrange(min(nperlumi,nlumi)))
+    indices.sort()
+    print ">>>   sampled %d/%d events in %d lumi sections of %d runs"%(
+            len(indices),events.size(),len(lumis),len(set(r for r, l in lumis)))
+    return indices
+    
+
+def iterSampled(events,indices):
+    """Iterate over selected event indices."""
+    for index in indices:
+      events.to(index)
+      yield events
+    
+
+def checkFile(filename,nmax,checks,nperlumi=0):
+    """Open a file once, and loop once over its events, loading only the products needed
+    by the enabled checks, and dispatching each event to these checks.
+    If nperlumi>0, only a sample of events per (run, lumi) is checked, and nmax is ignored,
+    so that every run and lumi section is covered."""
+    needed = [ ]
+    for check in checks:
+      title, prods, header = checkdefs[check]
+      print ">>> %s: %s"%(title,filename)
+      if check=='objects':
+        print ">>>   %-14s = %s"%('mytrignames',mytrignames)
+        print ">>>   %-14s = %s"%('mytrigtypes',mytrigtypes)
+        print ">>>   %-14s = %s"%('mytrigfilters',mytrigfilters)
+        print ">>>   %-14s = %s"%('ptmin',ptmin)
+      for product in prods:
+        if product not in needed:
+          needed.append(product)
+    loads    = [(products[p][1],getHandle(p)) for p in needed]
+    handlers = [checkhandlers[c] for c in checks]
+    header   = any(checkdefs[c][2] for c in checks)
+    events   = Events(filename)
+    if nperlumi>0:
+      events = iterSampled(events,sampleEvents(events,nperlumi))
     for ievent, event in enumerate(events,1):
-      if ievent>nmax: break
-      print ">>> %s event %1d %s"%('-'*10,ievent,'-'*60)
-      event.getByLabel(triggerBitLabel,triggerBits)
-      triggerNames = event.object().triggerNames(triggerBits.product())
-      for itrig, trigname in enumerate(triggerNames.triggerNames(),1):
-        if 'HLT_' not in trigname: continue
-        if not any(p in trigname for p in mytrignames): continue
-        index = triggerNames.triggerIndex(trigname)
-        fired = triggerBits.product().accept(index)
-        if fired:
-          print ">>>   trigger %2d: %s"%(itrig,bold(trigname+" (fired)"))
-        else:
-          print ">>>   trigger %2d: %s"%(itrig,trigname)
-    print '-'*80
+      if nperlumi<=0 and nmax>=0 and ievent>nmax: break
+      if header:
+        print ">>> %s event %1d %s"%('-'*10,ievent,'-'*60)
+      for label, handle in loads:
+        event.getByLabel(label,handle)
+      for handler in handlers:
+        handler(event)
+    if header:
+      print '-'*80
+    
+
+def printTauObjects(event):
+    taus = handles['taus']
+    for itau, tau in enumerate(taus.product()):
+      ###if tau.pt()<20: continue
+      #print "tau  %2d: pt %4.1f, dxy signif %.1f"%(itau,tau.pt(),tau.dxy_Sig())
+      print ">>>   tau  %2d: pt %4.1f, dxy signif %.1f, ID(byTightIsolationMVArun2v1DBoldDMwLT) %.1f, lead candidate pt %.1f, pdgId %d "%(
+                  itau,tau.pt(),tau.dxy_Sig(), tau.tauID("byTightIsolationMVArun2v1DBoldDMwLT"), tau.leadCand().pt(), tau.leadCand().pdgId())
+    
+
+def printTriggerPaths(event):
+    triggerBits = handles['triggerBits'].product()
+    menu        = getTriggerMenu(event,triggerBits)
+    for index, trigname in menu.paths:
+      fired = triggerBits.accept(index)
+      if fired:
+        print ">>>   trigger %2d: %s"%(index+1,bold(trigname+" (fired)"))
+      else:
+        print ">>>   trigger %2d: %s"%(index+1,trigname)
+    
+
+def countTriggerObjects(event):
+    triggerBits    = handles['triggerBits'].product()
+    triggerObjects = handles['triggerObjects']
+    menu           = getTriggerMenu(event,triggerBits)
+    taupaths       = menu.taupaths
+    for itrig, trigobj in enumerate(triggerObjects.product(),1):
+      if trigobj.pt()<ptmin: continue
+      if not any(t in mytrigtypes for t in trigobj.triggerObjectTypes()): continue
+      trigobj.unpackPathNames(menu.triggerNames) # cheap, with cached names
+      if not any(n in taupaths for n in trigobj.pathNames()): continue
+      trigobj.unpackFilterLabels(event.object(),triggerBits) # only for objects of interest
+      ###types = [t for t in trigobj.triggerObjectTypes()]
+      ###print ">>>   trigfilter %2d: pt %4.1f, type %s"%(itrig,trigobj.pt(),types)
+      ###for trigfilter in trigobj.filterLabels():
+      ###  if not any(p in trigfilter for p in mytrignames): continue
+      ###  print ">>>     filter %s"%trigfilter
+      filters.fill(trigobj.filterLabels(),trigobj.pathNames())
+      ###for trigname in trigobj.pathNames():
+      ###  print ">>>     path   %s"%trigname
+    
+
+checkhandlers = {
+  'taus':    printTauObjects,
+  'paths':   printTriggerPaths,
+  'objects': countTriggerObjects,
+}
+
+
+def checkFiles(filenames,nmax,checks,nperlumi=0):
+    """Check a list of files, and return the filter x path counts."""
+    for filename in filenames:
+      checkFile(filename,nmax,checks,nperlumi=nperlumi)
+    return filters
+    
+
+def _checkFileWorker(task):
+    """Check a single file in a worker process, starting from empty counters."""
+    filename, nmax, checks, nperlumi = task
+    filters.clear()
+    return checkFiles([filename],nmax,checks,nperlumi=nperlumi)
+    
+
+def mergeFilters(counters,others):
+    """Merge filter x path counts into the first."""
+    return counters.merge(others)
+    
+
+def printFilters(counters):
+    """Print the hits per path for each filter."""
+    for filter, paths in sorted(counters.todict().items()):
+      print ">>>\n>>> filter %s"%filter
+      for path, hits in sorted(paths.items(),key=lambda x: (x[1],x[0])):
+        print ">>>   %3d %s"%(hits,path)
+    print ">>> "
+    
+
+def checkTauObjects(filename,nmax):
+    checkFile(filename,nmax,['taus'])
     
 
+def checkTriggerPaths(filename,nmax):
+    checkFile(filename,nmax,['paths'])
+    
 
 def checkTriggerObjects(filename,nmax):
-    print ">>> checkTriggerObjects: %s"%(filename)
-    mytrignames   = ['Tau'] #['Ele','IsoMu','Tau']
-    mytrigfilters = [ ]
-    mytrigtypes   = [84] #[82,83,84]
-    ptmin         = 20
-    print ">>>   %-14s = %s"%('mytrignames',mytrignames)
-    print ">>>   %-14s = %s"%('mytrigtypes',mytrigtypes)
-    print ">>>   %-14s = %s"%('mytrigfilters',mytrigfilters)
-    print ">>>   %-14s = %s"%('ptmin',ptmin)
-    triggerBits, triggerBitLabel = Handle("edm::TriggerResults"), "TriggerResults::HLT"
-    triggerObjects, triggerObjectLabel = Handle("std::vector<pat::TriggerObjectStandAlone>"), "slimmedPatTrigger"
-    events = Events(filename)
-    for ievent, event in enumerate(events,1):
-      if ievent>nmax: break
-      ###print ">>> %s event %1d %s"%('-'*10,ievent,'-'*60)
-      event.getByLabel(triggerBitLabel,triggerBits)
-      event.getByLabel(triggerObjectLabel,triggerObjects)
-      #triggerNames = event.object().triggerNames(triggerBits.product())
-      for itrig, trigobj in enumerate(triggerObjects.product(),1):
-        if trigobj.pt()<ptmin: continue
-        if not any(t in mytrigtypes for t in trigobj.triggerObjectTypes()): continue
-        trigobj.unpackNamesAndLabels(event.object(),triggerBits.product())
-        if not any(isTauTrigger(n) for n in trigobj.pathNames()): continue
-        ###types = [t for t in trigobj.triggerObjectTypes()]
-        ###print ">>>   trigfilter %2d: pt %4.1f, type %s"%(itrig,trigobj.pt(),types)
-        for trigfilter in trigobj.filterLabels():
-          ###if not any(p in trigfilter for p in mytrignames): continue
-          ###print ">>>     filter %s"%trigfilter
-          if trigfilter not in filters:
-            filters[trigfilter] = { }
-          for trigname in trigobj.pathNames():
-            if trigname in filters[trigfilter]:
-              filters[trigfilter][trigname] += 1
-            else:
-              filters[trigfilter][trigname]  = 1
-        ###for trigname in trigobj.pathNames():
-        ###  print ">>>     path   %s"%trigname
-    ###print '-'*80
+    checkFile(filename,nmax,['objects'])
     
 
 def isTauTrigger(string):
@@ -139,6 +274,8 @@ def bold(string):
 def main():
     
     nmax     = args.nmax
+    nperlumi = args.nperlumi
+    checks   = [c for c in ['taus','paths','objects'] if c in args.checks] # fixed order
     director = "root://xrootd-cms.infn.it/"
         
     filenames = [
@@ -182,18 +319,22 @@ def main():
       #'/store/data/Run2018D/SingleMuon/MINIAOD/PromptReco-v2/000/320/569/00000/3C8C28E7-1A96-E811-BA8D-02163E012DD8.root',
     ]
     
-    for filename in filenames:
-      if '/store/' in filename and 'root:' not in filename:
-        filename = director+filename
-      #checkTauObjects(filename,nmax=nmax)
-      #checkTriggerPaths(filename,nmax=nmax)
-      checkTriggerObjects(filename,nmax=nmax)
+    filenames = [director+f if '/store/' in f and 'root:' not in f else f for f in filenames]
+    ncores    = min(args.ncores,len(filenames))
+    if ncores>1: # one file per task; merge counters in a reduction step
+      pool     = Pool(ncores)
+      tasks    = [(f,nmax,checks,nperlumi) for f in filenames]
+      counters = reduce(mergeFilters,pool.imap(_checkFileWorker,tasks,chunksize=1),FilterPathCounts())
+      pool.close()
+      pool.join()
+    else:
+      counters = checkFiles(filenames,nmax,checks,nperlumi=nperlumi)
     
-    for filter, paths in sorted(filters.items()):
-      print ">>>\n>>> filter %s"%filter
-      for path, hits in sorted(paths.items(),key=lambda x: x[1]):
-        print ">>>   %3d %s"%(hits,path)
-    print ">>> "
+    if 'objects' not in checks:
+      return
+    printFilters(counters)
+    if args.store:
+      counters.save(args.store)
     
 
 
@@ -12,6 +12,11 @@ options.register('dtype',   "", mytype=VarParsing.varType.string)
 options.register('trigger', "", mytype=VarParsing.varType.string) # only check these triggers
 options.register('veto',    "", mytype=VarParsing.varType.string) # hide triggers with these filters
 options.register('filter',  "", mytype=VarParsing.varType.string) # only show triggers with these filters
+options.register('cache',   "", mytype=VarParsing.varType.string) # directory to cache extracted HLT menus
+options.register('menus',   "", mytype=VarParsing.varType.string) # only report these cached HLT menus, without data
+options.register('json',    "", mytype=VarParsing.varType.string) # write summary to this JSON file
+options.register('count',    0,  mytype=VarParsing.varType.int)    # count accepts of selected paths per run & lumi
+options.register('firstEvents', 1, mytype=VarParsing.varType.int) # only process first event of each run (enough for menus)
 #options.register('trigtype', "", mytype=VarParsing.varType.string)
 options.parseArguments()
 #director = "file:root://xrootd-cms.infn.it/"     # DAS, use in Europe & Asia
@@ -21,6 +26,11 @@ verbose  = options.verbose>0
 nlast    = options.nlast
 year     = options.year
 dtype    = options.dtype
+cachedir = options.cache
+menus    = options.menus.split(',') if options.menus else [ ]
+outjson  = options.json
+count    = options.count>0
+firstEvents = options.firstEvents>0 and not count
 #trigtype = options.trigtype
 triggers = options.trigger.split(',') if options.trigger else [ # only check these triggers
   
@@ -250,6 +260,8 @@ files = [
   #'/store/data/Run2018D/Charmonium/MINIAOD/PromptReco-v2/000/320/570/00000/C4FD4873-4C96-E811-9678-FA163E8594B5.root',
   
 ]
+if options.inputFiles: # e.g. from runCheckTriggers.py
+  files = list(options.inputFiles)
 files = [director+f if f.startswith('/store/') else f for f in files]
 if   year==2016:    files = filter(lambda f: '/RunIISummer16' in f or '/Run2016' in f,files)
 elif year==2017:    files = filter(lambda f: '/RunIIFall17'   in f or '/Run2017' in f,files)
@@ -257,6 +269,85 @@ elif year==2018:    files = filter(lambda f: '/RunIIAutumn'   in f or '/Run2018'
 if   dtype=='data': files = filter(lambda f: '/store/mc/'   not in f,files)
 elif dtype=='mc':   files = filter(lambda f: '/store/data/' not in f,files)
 
+# FIRST EVENT PER RUN
+def getFirstEvents(filename):
+  """Get the first event of each run in a file from the event auxiliary, without reading other event data.
+  Fall back to the first lumi section of each run from the lumi index, if the events cannot be read,
+  or for runs in the lumi index without any event found.
+  Returns a list of event ranges, or None if the file has no index."""
+  import ROOT
+  from ROOT import TFile, gSystem
+  if not hasattr(ROOT,'FWLiteEnabler'):
+    gSystem.Load('libFWCoreFWLite')
+  ROOT.FWLiteEnabler.enable()
+  file = TFile.Open(filename.replace('file:root:','root:').replace('file:',''))
+  if not file or file.IsZombie():
+    return None
+  ranges = [ ]
+  runs   = { } # run -> first lumi
+  lumis  = file.Get('LuminosityBlocks')
+  if lumis:
+    try:
+      lumis.SetBranchStatus('*',0)
+      lumis.SetBranchStatus('LuminosityBlockAuxiliary*',1)
+      for i in xrange(lumis.GetEntries()):
+        if lumis.GetEntry(i)<=0:
+          raise IOError("Could not read entry %d"%(i))
+        aux = lumis.LuminosityBlockAuxiliary
+        if aux.run() not in runs or aux.luminosityBlock()<runs[aux.run()]:
+          runs[aux.run()] = aux.luminosityBlock()
+    except Exception as error:
+      print ">>> Warning! Could not read the lumi index of '%s': %s"%(filename,error)
+      runs = { }
+  found  = set() # runs with a first event
+  events = file.Get('Events')
+  if events and events.GetBranch('EventAuxiliary'):
+    try:
+      events.SetBranchStatus('*',0)
+      events.SetBranchStatus('EventAuxiliary*',1)
+      for i in xrange(events.GetEntries()):
+        if events.GetEntry(i)<=0:
+          raise IOError("Could not read entry %d"%(i))
+        aux = events.EventAuxiliary
+        if aux.run() in found: continue
+        found.add(aux.run())
+        ranges.append("%d:%d:%d"%(aux.run(),aux.luminosityBlock(),aux.event()))
+        if runs and found.issuperset(runs): break # stop as soon as all runs in the lumi index are covered
+    except Exception as error:
+      print ">>> Warning! Could not read the events of '%s': %s. Using the lumi index..."%(filename,error)
+      ranges, found = [ ], set()
+  if not ranges and not runs:
+    ranges = None
+  else: # full first lumi section of each run without any event found
+    ranges += ["%d:%d:1-%d:%d:%d"%(r,l,r,l,2**32-1) for r, l in sorted(runs.iteritems()) if r not in found]
+  file.Close()
+  return ranges
+  
+eventRanges = [ ]
+fullFiles   = [ ] # files without index, processed in a separate pass over all events
+if firstEvents and not menus:
+  seen = set()
+  for filename in files:
+    ranges = getFirstEvents(filename)
+    if ranges==None:
+      print ">>> Warning! Could not get run index of '%s'. Leaving it for a pass over all events..."%(filename)
+      fullFiles.append(filename)
+      continue
+    eventRanges.extend(r for r in ranges if r not in seen)
+    seen.update(ranges)
+  if len(fullFiles)==len(files): # no index at all: process all events in this job
+    fullFiles = [ ]
+  elif fullFiles: # eventsToProcess applies to all files in the source, so process these in a separate job
+    import sys
+    files   = [f for f in files if f not in fullFiles]
+    argv    = sys.argv[1:] if sys.argv[0].endswith('cmsRun') else sys.argv # configuration and options
+    command = ['cmsRun']+[a for a in argv if a.split('=')[0] not in ['inputFiles','firstEvents','json']]
+    command += ["firstEvents=0","inputFiles=%s"%(','.join(fullFiles))]
+    if outjson:
+      command.append("json=%s_full.json"%(outjson[:-5] if outjson.endswith('.json') else outjson))
+    print ">>> Warning! Only processing %d/%d files with a run index in this job. Please process the others with"%(len(files),len(files)+len(fullFiles))
+    print ">>>   %s"%(' '.join(command))
+
 # PRINT
 print ">>> %s checkTriggers_cfg.py %s"%('-'*15,'-'*36)
 print ">>> year          = %s"%year
@@ -268,21 +359,39 @@ print ">>> filters       = %s"%filters
 print ">>> checkFilters  = %s"%checkFilters
 print ">>> vetoTriggers  = %s"%vetoTriggers
 print ">>> ignoreFilters = %s"%ignoreFilters
-print ">>> files         = [\n>>>   '%s"%("',\n>>>   '".join(files))+"'"
-print ">>> ]"
+print ">>> cachedir      = %r"%cachedir
+print ">>> outjson       = %r"%outjson
+print ">>> count         = %s"%count
+print ">>> eventRanges   = %s"%eventRanges
+if fullFiles:
+  print ">>> fullFiles     = %s"%fullFiles
+if menus:
+  print ">>> menus         = %s"%menus
+else:
+  print ">>> files         = [\n>>>   '%s"%("',\n>>>   '".join(files))+"'"
+  print ">>> ]"
 print ">>> "+'-'*70
 
 # PROCESS
 process = cms.Process('TauPOG')
 process.load("FWCore.MessageService.MessageLogger_cfi")
-process.source = cms.Source('PoolSource',
-  fileNames = cms.untracked.vstring(*files),
-  eventsToProcess = cms.untracked.VEventRange('1:1-1:10','2:1-2:10'), # only check few events and runs
-  dropDescendantsOfDroppedBranches = cms.untracked.bool(False),
-  inputCommands = cms.untracked.vstring(
-    'drop *', # drop branches to avoid conflicts between data and MC files from different years
+if menus: # report cached menus only
+  assert cachedir, "Cached menus %s need a cache directory! Please set cache=<dir>"%(menus)
+  process.source = cms.Source('EmptySource')
+  process.maxEvents = cms.untracked.PSet(input=cms.untracked.int32(0))
+else:
+  process.source = cms.Source('PoolSource',
+    fileNames = cms.untracked.vstring(*files),
+    eventsToProcess = cms.untracked.VEventRange(*(eventRanges or [ ])), # only check first event of each run
+    dropDescendantsOfDroppedBranches = cms.untracked.bool(False),
+    inputCommands = cms.untracked.vstring(
+      'drop *', # drop branches to avoid conflicts between data and MC files from different years
+    )
   )
-)
+  if not eventRanges: # process all events
+    del process.source.eventsToProcess
+  if count: # count path accepts in all events
+    process.source.inputCommands.append('keep edmTriggerResults_TriggerResults__HLT')
 process.check = cms.EDAnalyzer('TriggerChecks',
   triggers      = cms.untracked.vstring(*triggers),
   filters       = cms.untracked.vstring(*filters),
@@ -290,6 +399,10 @@ process.check = cms.EDAnalyzer('TriggerChecks',
   vetoTriggers  = cms.untracked.vstring(*vetoTriggers),
   ignoreFilters = cms.untracked.vstring(*ignoreFilters),
   verbose       = cms.untracked.bool(verbose),
-  nlast         = cms.untracked.int32(nlast)
+  nlast         = cms.untracked.int32(nlast),
+  menuCacheDir  = cms.untracked.string(cachedir),
+  cachedMenus   = cms.untracked.vstring(*menus),
+  outputJSON    = cms.untracked.string(outjson),
+  countPaths    = cms.untracked.bool(count),
 )
 process.p = cms.Path(process.check)
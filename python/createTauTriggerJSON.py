@@ -6,10 +6,12 @@
 import json
 from collections import OrderedDict
 from utils import ensureDirectory
+from menuTools import loadMenuJSON, getLastFilters
 
 
-def createTauTriggerJSON(year):
+def createTauTriggerJSON(year,menus=None):
     """Define the tau trigger dictionairies and create a JSON file.
+    If a summary of HLT menus from the TriggerChecks plugin is given, the last filters are cross-checked.
     The format is as follows:
       'year'
          -> year
@@ -580,6 +582,16 @@ def createTauTriggerJSON(year):
           if filterbit not in data['filterbits'][object]:
             raise KeyError("Did not find '%s' in list of available filter bits nanoAOD for the %s object in %d: %s"%(filterbit,object,year,data['filterbits'][object].keys()))
     
+    # LAST FILTERS in HLT menus
+    if menus:
+      for hltpath in data['hltpaths']:
+        lastfilters = getLastFilters(menus,hltpath)
+        if not lastfilters:
+          print ">>> Warning! Did not find '%s' in the HLT menus..."%(hltpath)
+        elif data['hltpaths'][hltpath]['filter'] not in lastfilters:
+          print ">>> Warning! Last filter '%s' of '%s' does not match the HLT menus: %s"%(
+                  data['hltpaths'][hltpath]['filter'],hltpath,', '.join(sorted(lastfilters)))
+    
     
     ################
     #  WRITE JSON  #
@@ -627,8 +639,9 @@ def json_order(key,value):
 
 def main(args):
   years = args.years #[2016,2017,2018]
+  menus = loadMenuJSON(*args.menus,verbose=True) if args.menus else None
   for year in years:
-    createTauTriggerJSON(year)
+    createTauTriggerJSON(year,menus=menus)
   
 
 
@@ -638,6 +651,8 @@ if __name__ == '__main__':
   parser = ArgumentParser(prog="createTauTriggerJSON.py",description=description,epilog="Good luck!")
   parser.add_argument('-y', '--year',    dest='years', type=int, nargs='+', default=[2016,2017,2018],
                                          help="years to create a JSON for" )
+  parser.add_argument('-m', '--menus',   nargs='+', default=[ ],
+                                         help="JSON summaries of HLT menus from the TriggerChecks plugin, to cross-check the last filters" )
   ###parser.add_argument('-v', '--verbose', dest='verbosity', type=int, nargs='?', const=1, default=0, action='store',
   ###                                       help="set verbosity" )
   args = parser.parse_args()
@@ -0,0 +1,193 @@
+#! /usr/bin/env python
+# Description: Compact store of filter x path co-occurrence counts of trigger objects,
+#              with filter and path labels interned to integer IDs
+import os
+import numpy as np
+from fnmatch import fnmatchcase
+
+
+class FilterPathCounts:
+    """Sparse filter x path co-occurrence matrix.
+    Labels are interned to integer IDs, and the counts are kept per (filter ID, path ID) pair,
+    so memory only grows with the number of distinct pairs, not with the number of trigger objects.
+    Stores can be merged across jobs, and saved to / loaded from a compact numpy (.npz) file."""
+
+    def __init__(self):
+        self.filters   = [ ] # filter ID -> filter label
+        self.paths     = [ ] # path ID -> path label
+        self.filterids = { } # filter label -> filter ID
+        self.pathids   = { } # path label -> path ID
+        self.counts    = { } # (filter ID, path ID) -> hits
+        self._arrays   = None
+
+    def __len__(self):
+        """Number of distinct (filter, path) pairs."""
+        return len(self.counts)
+
+    def __repr__(self):
+        """Returns string representation of FilterPathCounts object."""
+        return "<%s(%d filters,%d paths,%d pairs) at %s>"%(self.__class__.__name__,
+                 len(self.filters),len(self.paths),len(self.counts),hex(id(self)))
+
+    def clear(self):
+        """Remove all labels and counts."""
+        self.__init__()
+
+    def filterid(self,filter):
+        """Get (or create) the ID of a filter label."""
+        id = self.filterids.get(filter,None)
+        if id==None:
+          id = len(self.filters)
+          self.filterids[filter] = id
+          self.filters.append(filter)
+        return id
+
+    def pathid(self,path):
+        """Get (or create) the ID of a path label."""
+        id = self.pathids.get(path,None)
+        if id==None:
+          id = len(self.paths)
+          self.pathids[path] = id
+          self.paths.append(path)
+        return id
+
+    def addids(self,fid,pid,hits=1):
+        """Add hits for a pair of filter and path IDs."""
+        key = (fid,pid)
+        self.counts[key] = self.counts.get(key,0) + hits
+        self._arrays = None
+
+    def add(self,filter,path,hits=1):
+        """Add hits for a pair of filter and path labels."""
+        self.addids(self.filterid(filter),self.pathid(path),hits)
+
+    def fill(self,filters,paths):
+        """Add one hit for each combination of the filters and paths of a trigger object."""
+        pids   = [self.pathid(p) for p in paths]
+        counts = self.counts
+        for filter in filters:
+          fid = self.filterid(filter)
+          for pid in pids:
+            key = (fid,pid)
+            counts[key] = counts.get(key,0) + 1
+        self._arrays = None
+
+    def merge(self,other):
+        """Merge the counts of another store into this one, remapping its IDs."""
+        fmap = [self.filterid(f) for f in other.filters]
+        pmap = [self.pathid(p) for p in other.paths]
+        for (fid,pid), hits in other.counts.iteritems():
+          self.addids(fmap[fid],pmap[pid],hits)
+        return self
+
+    def items(self):
+        """Iterate over (filter, path, hits)."""
+        for (fid,pid), hits in self.counts.iteritems():
+          yield self.filters[fid], self.paths[pid], hits
+
+    def todict(self):
+        """Convert to nested dictionary: filter -> path -> hits."""
+        counters = { }
+        for filter, path, hits in self.items():
+          counters.setdefault(filter,{ })[path] = hits
+        return counters
+
+    def arrays(self):
+        """Get the sparse matrix as three aligned arrays of filter IDs, path IDs and hits."""
+        if self._arrays==None:
+          npairs = len(self.counts)
+          fids   = np.fromiter((k[0] for k in self.counts.iterkeys()),dtype=np.uint32,count=npairs)
+          pids   = np.fromiter((k[1] for k in self.counts.iterkeys()),dtype=np.uint32,count=npairs)
+          hits   = np.fromiter(self.counts.itervalues(),dtype=np.uint64,count=npairs)
+          self._arrays = (fids,pids,hits)
+        return self._arrays
+
+    def _select(self,labels,ids,pattern):
+        """Get the IDs of the labels matching a pattern (with optional wildcards)."""
+        if any(c in pattern for c in '*?['):
+          return np.array([i for i, l in enumerate(labels) if fnmatchcase(l,pattern)],dtype=np.uint32)
+        return np.array([ids[pattern]] if pattern in ids else [ ],dtype=np.uint32)
+
+    def pathsForFilter(self,filter):
+        """Get the paths that share a filter (pattern), sorted by decreasing hits.
+        Returns a list of (path, hits)."""
+        fids, pids, hits = self.arrays()
+        mask   = np.in1d(fids,self._select(self.filters,self.filterids,filter))
+        sums   = np.bincount(pids[mask],weights=hits[mask],minlength=len(self.paths))
+        order  = np.argsort(-sums,kind='mergesort')
+        return [(self.paths[i],int(sums[i])) for i in order if sums[i]>0]
+
+    def topFilters(self,path,n=10):
+        """Get the top n filters for a path (pattern), sorted by decreasing hits.
+        Returns a list of (filter, hits)."""
+        fids, pids, hits = self.arrays()
+        mask   = np.in1d(pids,self._select(self.paths,self.pathids,path))
+        sums   = np.bincount(fids[mask],weights=hits[mask],minlength=len(self.filters))
+        order  = np.argsort(-sums,kind='mergesort')
+        result = [(self.filters[i],int(sums[i])) for i in order if sums[i]>0]
+        return result[:n] if n>0 else result
+
+    def save(self,filename):
+        """Save to a compressed numpy file."""
+        fids, pids, hits = self.arrays()
+        np.savez_compressed(filename,filters=np.array(self.filters,dtype=str),paths=np.array(self.paths,dtype=str),
+                            fids=fids,pids=pids,hits=hits)
+        print ">>> FilterPathCounts.save: saved %d filters, %d paths and %d pairs to '%s'"%(
+                len(self.filters),len(self.paths),len(self.counts),filename)
+
+    @classmethod
+    def load(cls,filename):
+        """Load from a numpy file created by FilterPathCounts.save."""
+        if not os.path.isfile(filename):
+          raise OSError('File in path "%s" does not exist!'%(filename))
+        store = cls()
+        with np.load(filename) as data:
+          store.filters   = data['filters'].tolist()
+          store.paths     = data['paths'].tolist()
+          store.filterids = { f: i for i, f in enumerate(store.filters) }
+          store.pathids   = { p: i for i, p in enumerate(store.paths) }
+          fids, pids, hits = data['fids'], data['pids'], data['hits']
+          store.counts    = dict(zip(zip(fids.tolist(),pids.tolist()),hits.tolist()))
+          store._arrays   = (fids,pids,hits)
+        return store
+
+
+
+def main(args):
+  store = None
+  for filename in args.infiles:
+    if store==None:
+      store = FilterPathCounts.load(filename)
+    else:
+      store.merge(FilterPathCounts.load(filename))
+  print ">>> %r"%(store)
+  if args.outfile:
+    store.save(args.outfile)
+  for filter in args.filters:
+    print ">>>\n>>> paths sharing filter %s"%filter
+    for path, hits in store.pathsForFilter(filter):
+      print ">>>   %3d %s"%(hits,path)
+  for path in args.paths:
+    print ">>>\n>>> top filters for path %s"%path
+    for filter, hits in store.topFilters(path,n=args.ntop):
+      print ">>>   %3d %s"%(hits,filter)
+
+
+
+if __name__ == '__main__':
+  from argparse import ArgumentParser
+  description = """Query (and merge) stores of filter x path co-occurrences created by checkMiniAOD.py."""
+  parser = ArgumentParser(prog="filterPathStore.py",description=description,epilog="Good luck!")
+  parser.add_argument('infiles',         nargs='+',
+                                         help="stores (.npz) to load; several stores are merged" )
+  parser.add_argument('-o', '--outfile', default=None,
+                                         help="save merged store to this file" )
+  parser.add_argument('-f', '--filter',  dest='filters', nargs='+', default=[ ],
+                                         help="list paths sharing these filters (wildcards allowed)" )
+  parser.add_argument('-p', '--path',    dest='paths', nargs='+', default=[ ],
+                                         help="list top filters for these paths (wildcards allowed)" )
+  parser.add_argument('-n', '--ntop',    type=int, default=10,
+                                         help="number of top filters to list" )
+  args = parser.parse_args()
+  main(args)
+
@@ -8,6 +8,7 @@ import numpy as np
 objectids   = { 'Electron': 11, 'Muon': 13, 'Tau': 15, } 
 collections = { 1: 'Jet', 6: 'FatJet', 2: 'MET', 3: 'HT', 4: 'MHT',
                 11: 'Electron', 13: 'Muon', 15: 'Tau', 22: 'Photon', } 
+encodings   = ['int','uint8','packed'] # output encodings of the number of matches (see matchBranches)
 
 
 
@@ -122,6 +123,61 @@ class Trigger:
         #self.fired = lambda e: any(e.p for p in self.paths)
       else:
         self.fired = lambda e: True
+      
+    def bind(self,hltbits):
+      """Evaluate 'fired' as a mask test on the per-event bitset of an HLTBitset."""
+      if not self.paths: return
+      mask = 0
+      for path in self.paths:
+        mask |= hltbits.masks[path]
+      self.mask  = mask
+      self.fired = lambda e: (hltbits.read(e)&mask)!=0
+    
+
+
+class HLTBitset:
+    """Container class for the decisions of all distinct HLT paths of some triggers,
+    read once per event into a bitset. The 'fired' method of each trigger becomes a mask test."""
+    def __init__(self,triggers,verbose=False):
+      paths = sorted(set(p for t in triggers for p in t.paths))
+      self.paths    = paths                                      # list of HLT paths, one per bit
+      self.masks    = { p: 1<<i for i, p in enumerate(paths) }   # HLT path -> bit
+      self.buffer   = np.zeros(len(paths),dtype=np.bool_)        # decisions of current event, one per path
+      self.weights  = np.array([1<<i for i in xrange(64)],dtype=np.uint64)
+      self.branches = [ ]
+      self.entry    = -1
+      self.bits     = 0
+      self.verbose  = verbose
+      for trigger in triggers:
+        trigger.bind(self)
+      
+    def beginFile(self,tree):
+      """Resolve the HLT paths to the branches of a new tree."""
+      self.branches = [ ]
+      self.buffer[:] = False
+      for i, path in enumerate(self.paths):
+        branch = tree.GetBranch(path)
+        if not branch:
+          print ">>> HLTBitset: Warning! Path '%s' is not in this file, setting it to not fired..."%(path)
+          continue
+        tree.SetBranchAddress(path,self.buffer[i:i+1])
+        self.branches.append(branch)
+      self.entry = -1
+      if self.verbose:
+        print ">>> HLTBitset: resolved %d/%d HLT paths"%(len(self.branches),len(self.paths))
+      
+    def read(self,event):
+      """Read the decisions of an event into the bitset, once per event."""
+      if event._entry!=self.entry:
+        for branch in self.branches:
+          branch.GetEntry(event._entry)
+        bits = 0
+        for i in xrange(0,len(self.paths),64): # 64 paths per word
+          word  = self.buffer[i:i+64]
+          bits |= int(np.dot(word,self.weights[:len(word)]))<<i
+        self.bits  = bits
+        self.entry = event._entry
+      return self.bits
     
 
 
@@ -194,6 +250,57 @@ class FilterPair:
     
 
 
+def matchBranches(branch,wps,encoding='int'):
+    """Names, types and titles of the output branches with the number of matches of a filter (or pair) per WP.
+    The number of matches is -2 (HLT not fired), -1 (no trigger object), 0 (no match) or the number of matches, encoded as
+      'int':    one Int_t branch per WP with the number itself,
+      'uint8':  one UChar_t branch per WP with the number plus 2, saturating at 255,
+      'packed': one status word for all WPs, with the number plus 2 in 4 bits per WP, saturating at 15.
+    Use matchExpr or decodeMatches to get back the number of matches."""
+    assert encoding in encodings, "Wrong encoding '%s'! It should be in %s"%(encoding,encodings)
+    if encoding=='packed':
+      assert len(wps)<=8, "Cannot pack more than 8 WPs into 32 bits!"
+      type = 'b' if len(wps)<=2 else 'i'
+      return [(branch,type,"number of matches + 2 in 4 bits per WP (%s)"%(', '.join(wps)))]
+    type = 'b' if encoding=='uint8' else 'I'
+    return [(branch+("" if wp=='all' else '_'+wp),type,"number of matches"+(" + 2" if encoding=='uint8' else "")) for wp in wps]
+    
+
+def encodeMatches(nmatches,encoding='int'):
+    """Encode a list of numbers of matches (one per WP) into the values to fill the branches of matchBranches."""
+    if encoding=='int':
+      return nmatches
+    if encoding=='uint8':
+      return [min(max(n+2,0),255) for n in nmatches]
+    word = 0
+    for i, n in enumerate(nmatches):
+      word |= min(max(n+2,0),15)<<(4*i)
+    return [word]
+    
+
+def decodeMatches(values,index=0,encoding='int'):
+    """Decode the values of a branch of matchBranches (numbers or numpy arrays) into the number of matches
+    of the WP with some index."""
+    values = np.asarray(values).astype(np.int64)
+    if encoding=='packed':
+      return ((values>>(4*index))&15)-2
+    if encoding=='uint8':
+      return values-2
+    return values
+    
+
+def matchExpr(branch,wps,wp,encoding='int'):
+    """TTreeFormula expression (e.g. for TTree::Draw) of the number of matches of some WP,
+    decoded from the branches of matchBranches."""
+    if encoding=='packed':
+      return "(((%s>>%d)&15)-2)"%(branch,4*wps.index(wp))
+    name = branch+("" if wp=='all' else '_'+wp)
+    if encoding=='uint8':
+      return "(%s-2)"%(name)
+    return name
+    
+
+
 #def getBits(x):
 #  """Decompose integer into list of bits (powers of 2)."""
 #  powers = [ ]
@@ -0,0 +1,217 @@
+#! /usr/bin/env python
+# Description: Index the trigger and filter summaries of the TriggerChecks plugin
+#              (output/*.log, or JSON files from checkTriggers_cfg.py json=<file>) in a SQLite database,
+#              to quickly query menus, paths and filters across all logs
+import os, re, json, sqlite3
+from fnmatch import fnmatchcase
+
+ansiexp   = re.compile(r"\x1B\[[0-9;]+[A-Za-z]") # color codes, see output/removeColor.sh
+menuexp   = re.compile(r">>>   HLT menu name: '([^']+)'")
+gtexp     = re.compile(r">>>   Global tag:    '([^']+)'")
+boxexp    = re.compile(r"  \*{4} Summary of filters per trigger in '([^']+)'")
+pathexp   = re.compile(r"  \*   (\S+)\s*\*$")
+filterexp = re.compile(r"  \*     (?:-> )?(?:(\d+)\) )?(\S+)(?: \((\w+)\))?\s*\*$")
+schema    = """
+CREATE TABLE IF NOT EXISTS files   ( id INTEGER PRIMARY KEY, name TEXT UNIQUE, mtime REAL, size INTEGER );
+CREATE TABLE IF NOT EXISTS menus   ( file INTEGER, globaltag TEXT, menu TEXT );
+CREATE TABLE IF NOT EXISTS entries ( file INTEGER, globaltag TEXT, path TEXT, filter TEXT, highlight INTEGER, type TEXT, position INTEGER );
+CREATE INDEX IF NOT EXISTS menus_globaltag   ON menus(globaltag);
+CREATE INDEX IF NOT EXISTS entries_filter    ON entries(filter);
+CREATE INDEX IF NOT EXISTS entries_path      ON entries(path);
+CREATE INDEX IF NOT EXISTS entries_globaltag ON entries(globaltag);
+CREATE INDEX IF NOT EXISTS entries_file      ON entries(file);
+"""
+
+
+def parseLog(filename):
+  """Parse the printout of the TriggerChecks plugin.
+  Returns a list of (global tag, menu), and a list of (global tag, path, filter, highlight, type, position).
+  Entries of the merged 'All' summary are kept under global tag 'All' if they are not in any per-tag summary."""
+  menus, entries = [ ], [ ]
+  merged = [ ] # entries of the merged summary
+  menu = None
+  globaltag = None # in summary box
+  path = None
+  with open(filename,'r') as file:
+    for line in file:
+      line = ansiexp.sub('',line.rstrip('\n'))
+      if not line.startswith('  *'):
+        match = menuexp.match(line)
+        if match:
+          menu = match.group(1)
+          continue
+        match = gtexp.match(line)
+        if match and menu:
+          if (match.group(1),menu) not in menus:
+            menus.append((match.group(1),menu))
+          menu = None
+        continue
+      match = boxexp.match(line)
+      if match:
+        globaltag = match.group(1)
+        path = None
+        continue
+      if line.startswith('  ****'): # other summary box, or end of box
+        globaltag = None
+        continue
+      if globaltag==None:
+        continue
+      match = pathexp.match(line)
+      if match:
+        path = match.group(1)
+        continue
+      match = filterexp.match(line)
+      if match and path:
+        position, filter, type = match.groups()
+        highlight = line.startswith('  *     -> ')
+        entry = (globaltag,path,filter,int(highlight),type,int(position) if position else None)
+        (merged if globaltag=='All' else entries).append(entry)
+  seen = set((e[1],e[2]) for e in entries)
+  entries.extend(e for e in merged if (e[1],e[2]) not in seen)
+  return menus, entries
+
+
+def parseJSON(filename):
+  """Parse the JSON summary of the TriggerChecks plugin (outputJSON).
+  Returns a list of (global tag, menu), and a list of (global tag, path, filter, highlight, type, position)."""
+  with open(filename,'r') as file:
+    data = json.load(file)
+  menus, entries = [ ], [ ]
+  for globaltag, tables in data['menus'].iteritems():
+    menus.extend((globaltag,m) for m in tables)
+  for globaltag, paths in data['lastFilters'].iteritems():
+    for path, filters in paths.iteritems():
+      nlast = len(filters)
+      for i, filter in enumerate(filters,1):
+        entries.append((globaltag,path,filter,0,None,i if nlast>1 else None))
+  for globaltag, paths in data['checkedFilters'].iteritems():
+    for path, filters in paths.iteritems():
+      for filter, type in filters.iteritems():
+        entries.append((globaltag,path,filter,1,type.strip('()'),None))
+  return menus, entries
+
+
+class LogIndex:
+    """SQLite index of trigger menus, paths and filters, ingested from log or JSON files.
+    Files are only re-ingested if their modification time or size changed."""
+
+    def __init__(self,dbname='output/triggers.db'):
+        self.dbname = dbname
+        self.db     = sqlite3.connect(dbname)
+        self.db.executescript(schema)
+
+    def close(self):
+        self.db.close()
+
+    def ingest(self,filename,verbose=False):
+        """Parse a file, and (re)place its entries in the index if it changed.
+        Returns True if the file was (re)ingested."""
+        if not os.path.isfile(filename):
+          raise OSError('File in path "%s" does not exist!'%(filename))
+        name  = os.path.abspath(filename)
+        stat  = os.stat(filename)
+        row   = self.db.execute("SELECT id, mtime, size FROM files WHERE name=?",(name,)).fetchone()
+        if row and row[1]==stat.st_mtime and row[2]==stat.st_size:
+          return False
+        if filename.endswith('.json'):
+          menus, entries = parseJSON(filename)
+        else:
+          menus, entries = parseLog(filename)
+        with self.db: # one transaction per file
+          if row:
+            fid = row[0]
+            self.db.execute("DELETE FROM menus WHERE file=?",(fid,))
+            self.db.execute("DELETE FROM entries WHERE file=?",(fid,))
+            self.db.execute("UPDATE files SET mtime=?, size=? WHERE id=?",(stat.st_mtime,stat.st_size,fid))
+          else:
+            fid = self.db.execute("INSERT INTO files (name, mtime, size) VALUES (?,?,?)",(name,stat.st_mtime,stat.st_size)).lastrowid
+          self.db.executemany("INSERT INTO menus VALUES (?,?,?)",((fid,)+m for m in menus))
+          self.db.executemany("INSERT INTO entries VALUES (?,?,?,?,?,?,?)",((fid,)+e for e in entries))
+        if verbose:
+          print ">>> LogIndex.ingest: %d menus and %d entries from '%s'"%(len(menus),len(entries),filename)
+        return True
+
+    def prune(self):
+        """Remove files that no longer exist from the index."""
+        with self.db:
+          for fid, name in self.db.execute("SELECT id, name FROM files").fetchall():
+            if not os.path.isfile(name):
+              self.db.execute("DELETE FROM menus WHERE file=?",(fid,))
+              self.db.execute("DELETE FROM entries WHERE file=?",(fid,))
+              self.db.execute("DELETE FROM files WHERE id=?",(fid,))
+
+    def menusWithFilter(self,pattern):
+        """Get the (global tag, menu, path) that contain a filter (with optional wildcards, like fnmatch).
+        The logs do not tell which of the menus of a global tag has a path, so menu is None
+        unless the global tag has only one menu in that file."""
+        query = """SELECT DISTINCT e.globaltag, m.menu, e.path FROM entries e
+                   LEFT JOIN ( SELECT file, globaltag, MIN(menu) AS menu FROM menus GROUP BY file, globaltag
+                               HAVING COUNT(DISTINCT menu)=1 ) m ON m.file=e.file AND m.globaltag=e.globaltag
+                   WHERE e.filter GLOB ? ORDER BY e.globaltag, m.menu, e.path"""
+        return self.db.execute(query,(pattern,)).fetchall()
+
+    def filtersForPath(self,pattern,globaltag='*'):
+        """Get the (global tag, path, filter, highlight, type) of a path (with optional wildcards)."""
+        query = """SELECT DISTINCT globaltag, path, filter, highlight, type FROM entries
+                   WHERE path GLOB ? AND globaltag GLOB ? ORDER BY globaltag, path, highlight DESC, position, filter"""
+        return self.db.execute(query,(pattern,globaltag)).fetchall()
+
+    def menus(self,globaltag='*'):
+        """Get the (global tag, menu) pairs."""
+        query = "SELECT DISTINCT globaltag, menu FROM menus WHERE globaltag GLOB ? ORDER BY globaltag, menu"
+        return self.db.execute(query,(globaltag,)).fetchall()
+
+
+
+def main(args):
+  index    = LogIndex(args.dbname)
+  infiles  = [ ]
+  for infile in args.infiles:
+    if os.path.isdir(infile):
+      infiles.extend(os.path.join(infile,f) for f in sorted(os.listdir(infile)) if fnmatchcase(f,'*.log') or fnmatchcase(f,'*.json'))
+    else:
+      infiles.append(infile)
+  nnew = sum(index.ingest(f,verbose=args.verbose) for f in infiles)
+  if infiles:
+    print ">>> Ingested %d/%d files in '%s'"%(nnew,len(infiles),args.dbname)
+  if args.prune:
+    index.prune()
+  if args.menus:
+    print ">>>\n>>> menus"
+    for globaltag, menu in index.menus(args.globaltag):
+      print ">>>   %-45s %s"%(globaltag,menu)
+  for filter in args.filters:
+    print ">>>\n>>> menus containing filter %s"%filter
+    for globaltag, menu, path in index.menusWithFilter(filter):
+      print ">>>   %-45s %-45s %s"%(globaltag,menu or "-",path)
+  for path in args.paths:
+    print ">>>\n>>> filters of path %s"%path
+    for globaltag, path, filter, highlight, type in index.filtersForPath(path,args.globaltag):
+      print ">>>   %-45s %-50s %s%s%s"%(globaltag,path,"-> " if highlight else "",filter," (%s)"%type if type else "")
+  index.close()
+
+
+
+if __name__ == '__main__':
+  from argparse import ArgumentParser
+  description = """Index the trigger and filter logs of the TriggerChecks plugin, and query them."""
+  parser = ArgumentParser(prog="logIndex.py",description=description,epilog="Good luck!")
+  parser.add_argument('infiles',           nargs='*', default=[ ],
+                                           help="log or JSON files (or directories) to (re)ingest if changed" )
+  parser.add_argument('-d', '--db',        dest='dbname', default='output/triggers.db',
+                                           help="SQLite database file" )
+  parser.add_argument('-f', '--filter',    dest='filters', nargs='+', default=[ ],
+                                           help="list menus and paths containing these filters (wildcards allowed)" )
+  parser.add_argument('-p', '--path',      dest='paths', nargs='+', default=[ ],
+                                           help="list filters of these paths (wildcards allowed)" )
+  parser.add_argument('-g', '--globaltag', default='*',
+                                           help="only list paths or menus of these global tags (wildcards allowed)" )
+  parser.add_argument('-m', '--menus',     action='store_true',
+                                           help="list all menus" )
+  parser.add_argument('-P', '--prune',     action='store_true',
+                                           help="remove files that no longer exist from the index" )
+  parser.add_argument('-v', '--verbose',   action='store_true',
+                                           help="set verbose" )
+  args = parser.parse_args()
+  main(args)
+
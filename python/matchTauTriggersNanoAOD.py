@@ -12,7 +12,11 @@ from utils import ensureDirectory
 from PhysicsTools.NanoAODTools.postprocessing.framework.postprocessor import PostProcessor
 from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Collection
 from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
-from filterTools import loadTriggersFromJSON, collections
+from filterTools import loadTriggersFromJSON, HLTBitset, collections, encodings, matchBranches, encodeMatches, matchExpr
+from branchReader import NanoArrayReader, deltaR
+from plotTools import PlotQueue
+from sampling import ClusterSampler, formatEff
+from metrics import MetricsMonitor, MemoryTracker
 from ROOT import PyConfig, gROOT, gDirectory, gPad, gStyle, TFile, TCanvas, TLegend, TLatex, TH1F
 PyConfig.IgnoreCommandLineOptions = True
 gROOT.SetBatch(True)
@@ -23,27 +27,34 @@ gStyle.SetOptStat(False) #gStyle.SetOptStat(1110)
 
 class TauTriggerChecks(Module):
     
-    def __init__(self,year=2017,wps=['loose','medium','tight'],datatype='mc',verbose=True):
+    def __init__(self,year=2017,wps=['loose','medium','tight'],datatype='mc',encoding='int',verbose=True):
         
         assert year in [2016,2017,2018], "Year should be 2016, 2017 or 2018"
         assert datatype in ['mc','data'], "Wrong datatype '%s'! It should be 'mc' or 'data'!"%datatype
+        assert encoding in encodings, "Wrong encoding '%s'! It should be in %s"%(encoding,encodings)
         
         jsonfile = "json/tau_triggers_%d.json"%year
         filters, filterpairs, triggers = loadTriggersFromJSON(jsonfile,verbose=verbose)
         
         # FILTER bits
         self.verbose     = verbose
+        self.encoding    = encoding # of the number of matches in the output branches
         self.filters     = filters
         self.triggers    = triggers[datatype]
         self.trigger     = lambda e: self.triggers['etau'].fired(e) or self.triggers['mutau'].fired(e) or self.triggers['ditau'].fired(e) or\
                                      self.triggers['SingleElectron'].fired(e) or self.triggers['SingleMuon'].fired(e)
         self.filterpairs = filterpairs
+        self.hltbits     = HLTBitset([f.trigger for f in filters]+[p.trigger for p in filterpairs]+self.triggers.values(),
+                                     verbose=verbose) # read all HLT decisions once per event
         self.unique_filters = [ ]
         unique_filter_names = [ ]
         for filter in filters:
           if filter not in unique_filter_names:
             self.unique_filters.append(filter)
             unique_filter_names.append(filter.name)
+        self.nobjects    = { } # filter or pair -> number of events with trigger objects
+        self.nmatched    = { } # filter or pair -> number of events with at least one match
+        self.nmatchobjs  = 0   # total number of objects matched to trigger filters
         
         # TAU ID WP bits
         tauIDWPs = { wp: 2**i for i, wp in enumerate(['vvloose','vloose','loose','medium','tight','vtight','vvtight']) }
@@ -57,20 +68,37 @@ class TauTriggerChecks(Module):
         
     def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
         """Create branches in output tree."""
+        self.hltbits.beginFile(inputTree)
+        self.reader = NanoArrayReader(inputTree,{ # bind before the collections are used
+          'TrigObj':  ['id','filterBits','eta','phi'],
+          'Electron': ['eta','phi'],
+          'Muon':     ['eta','phi'],
+          'Tau':      ['eta','phi','idMVAoldDM2017v2'],
+        })
         self.out = wrappedOutputTree
         self.out.branch("trigger_etau",           'O')
         self.out.branch("trigger_mutau",          'O')
         self.out.branch("trigger_ditau",          'O')
         self.out.branch("trigger_SingleMuon",     'O')
         self.out.branch("trigger_SingleElectron", 'O')
+        self.matchbranches = { } # filter or pair -> names of branches
         for filter in self.unique_filters:
-          for wpbit, wp in self.objectIDWPs[filter.id]:
-            wptag = "" if wp=='all' else '_'+wp
-            self.out.branch("n%s_%s%s"%(filter.collection,filter.name,wptag), 'I')
+          self.createMatchBranches(filter,"n%s_%s"%(filter.collection,filter.name),self.objectIDWPs[filter.id])
         for pair in self.filterpairs:
-          for wpbit, wp in self.objectIDWPs[15]:
-            wptag = "" if wp=='all' else '_'+wp
-            self.out.branch("nPair_%s%s"%(pair.name,wptag), 'I')
+          self.createMatchBranches(pair,"nPair_%s"%(pair.name),self.objectIDWPs[15])
+        
+    def createMatchBranches(self,key,branch,wps):
+        """Create the branches of the number of matches per WP in the chosen encoding."""
+        self.matchbranches[key] = [ ]
+        for name, type, title in matchBranches(branch,[w for b, w in wps],self.encoding):
+          self.out.branch(name,type,title=title)
+          self.matchbranches[key].append(name)
+        
+    def fillMatchBranches(self,key,nmatches,wps):
+        """Fill the branches of the number of matches per WP in the chosen encoding."""
+        values = encodeMatches([nmatches[b] for b, w in wps],self.encoding)
+        for name, value in zip(self.matchbranches[key],values):
+          self.out.fillBranch(name,value)
         
     def analyze(self, event):
         """Process event, return True (pass, go to next module) or False (fail, go to next event)."""
@@ -80,30 +108,23 @@ class TauTriggerChecks(Module):
           return False
         ###print "%s %s passed the trigger %s"%('-'*20,event.event,'-'*40)
         
-        # TRIGGER OBJECTS
-        trigObjects   = { }
-        for trigobj in Collection(event,'TrigObj'):
-          ###print trigobj, trigobj.filterBits
-          if trigobj.id not in [11,13,15]: continue
-          if trigobj.id not in trigObjects:
-            trigObjects[trigobj.id] = { }
-          trigObjects[trigobj.id][trigobj] = [ ]
+        # TRIGGER OBJECTS as arrays
+        reader        = self.reader.read(event._entry)
+        trigObjs      = reader.get('TrigObj')
         
         # PREPARE COUNTERS
         nMatches      = { }
         nPairMatches  = { }
-        filterMatches = { f: [ ] for f in self.filters }
+        nomatch       = (np.zeros(0,dtype=np.int64),np.zeros(0,dtype=np.int64))
+        filterMatches = { f: nomatch for f in self.filters } # filter -> indices of matched (trigger objects, reco objects)
+        trigFilters   = { } # object ID -> list of (filter, mask of trigger objects with the filter bits)
         for filter in self.unique_filters:
           nMatches[filter] = { }
           default = -2 # filter's trigger was not fired
           if filter.trigger.fired(event):
-            trigObjExists = False
-            if filter.id in trigObjects:
-              for trigobj, filters in trigObjects[filter.id].iteritems():
-                if filter.hasbits(trigobj.filterBits):
-                  filters.append(filter)
-                  trigObjExists = True
-            if trigObjExists:
+            passed = (trigObjs['id']==filter.id) & ((trigObjs['filterBits']&filter.bits)==filter.bits)
+            if passed.any():
+              trigFilters.setdefault(filter.id,[ ]).append((filter,passed))
               default = 0 # event has trigger object for these filter bits
             else:
               default = -1 # event has no trigger object for these filter bits
@@ -120,62 +141,40 @@ class TauTriggerChecks(Module):
           for wpbit, wp in self.objectIDWPs[15]:
             nPairMatches[pair][wpbit] = default
         
-        # MATCH ELECTRONS
-        if 11 in trigObjects:
-          electrons = Collection(event,'Electron')
-          for electron in electrons:
-            for trigobj, filters in trigObjects[11].iteritems():
-              if electron.DeltaR(trigobj)>0.3: continue
-              for filter in filters:
-                #if electron.pt<filter.ptmin: continue
-                nMatches[filter][0] += 1
-                filterMatches[filter].append((trigobj,electron))
-        
-        # MATCH MUONS
-        if 13 in trigObjects:
-          muons = Collection(event,'Muon')
-          for muon in muons:
-            for trigobj, filters in trigObjects[13].iteritems():
-              if muon.DeltaR(trigobj)>0.3: continue
-              for filter in filters:
-                #if muon.pt<filter.ptmin: continue
-                nMatches[filter][0] += 1
-                filterMatches[filter].append((trigobj,muon))
-        
-        # MATCH TAUS
-        if 15 in trigObjects:
-          taus = Collection(event,'Tau')
-          for tau in taus:
-            #dm = tau.decayMode
-            #if dm not in [0,1,10]: continue
-            for trigobj, filters in trigObjects[15].iteritems():
-              if tau.DeltaR(trigobj)>0.3: continue
-              for filter in filters:
-                #if tau.pt<filter.ptmin: continue
-                filterMatches[filter].append((trigobj,tau))
-                for wpbit, wp in self.objectIDWPs[15]: # ascending order
-                  if tau.idMVAoldDM2017v2<wpbit: break
-                  nMatches[filter][wpbit] += 1
+        # MATCH ELECTRONS, MUONS & TAUS
+        for id, filters in trigFilters.iteritems():
+          recoObjs = reader.get(collections[id])
+          close    = deltaR(recoObjs['eta'],recoObjs['phi'],trigObjs['eta'],trigObjs['phi'])<=0.3 # reco x trigger objects
+          for filter, passed in filters:
+            irecos, itrigs = np.nonzero(close & passed)
+            filterMatches[filter] = (itrigs,irecos)
+            if id==15:
+              tauids = recoObjs['idMVAoldDM2017v2'][irecos]
+              for wpbit, wp in self.objectIDWPs[15]: # ascending order
+                nMatches[filter][wpbit] += np.count_nonzero(tauids>=wpbit)
+            else:
+              #if recoObj.pt<filter.ptmin: continue
+              nMatches[filter][0] += len(irecos)
         
         # MATCH PAIRS
         for pair in self.filterpairs:
+          itrigs1, irecos1 = filterMatches[pair.filter1]
+          itrigs2, irecos2 = filterMatches[pair.filter2]
+          if not len(irecos1) or not len(irecos2): continue
+          recoObjs1 = reader.get(pair.filter1.collection)
+          recoObjs2 = reader.get(pair.filter2.collection)
           if pair.filter1==pair.filter2: # for ditau
-            for i, (trigobj1,recoobj1) in enumerate(filterMatches[pair.filter1]):
-              for trigobj2, recoobj2 in filterMatches[pair.filter1][i+1:]:
-                if trigobj1==trigobj2: continue
-                if recoobj1==recoobj2: continue
-                #if recoobj1.DeltaR(recoobj2)<0.4: continue
-                for wpbit, wp in self.objectIDWPs[15]: # ascending order
-                  if recoobj1.idMVAoldDM2017v2<wpbit or recoobj2.idMVAoldDM2017v2<wpbit: break
-                  nPairMatches[pair][wpbit] += 1
+            valid  = np.triu(np.ones((len(irecos1),len(irecos1)),dtype=bool),1) # each combination once
+            valid &= np.not_equal.outer(itrigs1,itrigs1) & np.not_equal.outer(irecos1,irecos1)
+            #valid &= deltaR(recoObjs1['eta'][irecos1],recoObjs1['phi'][irecos1],recoObjs1['eta'][irecos1],recoObjs1['phi'][irecos1])>=0.4
+            tauids = recoObjs1['idMVAoldDM2017v2'][irecos1]
+            wpids  = np.minimum.outer(tauids,tauids)[valid]
           else: # for eletau and mutau
-            for trigobj1, recoobj1 in filterMatches[pair.filter1]:
-              for trigobj2, recoobj2 in filterMatches[pair.filter2]:
-                if trigobj1.DeltaR(trigobj2)<0.3: continue
-                if recoobj1.DeltaR(recoobj2)<0.3: continue
-                for wpbit, wp in self.objectIDWPs[15]: # ascending order
-                  if recoobj2.idMVAoldDM2017v2<wpbit: break
-                  nPairMatches[pair][wpbit] += 1
+            valid  = deltaR(trigObjs['eta'][itrigs1],trigObjs['phi'][itrigs1],trigObjs['eta'][itrigs2],trigObjs['phi'][itrigs2])>=0.3
+            valid &= deltaR(recoObjs1['eta'][irecos1],recoObjs1['phi'][irecos1],recoObjs2['eta'][irecos2],recoObjs2['phi'][irecos2])>=0.3
+            wpids  = np.broadcast_to(recoObjs2['idMVAoldDM2017v2'][irecos2],valid.shape)[valid]
+          for wpbit, wp in self.objectIDWPs[15]: # ascending order
+            nPairMatches[pair][wpbit] += np.count_nonzero(wpids>=wpbit)
         
         # FILL BRANCHES
         self.out.fillBranch("trigger_etau",           self.triggers['etau'].fired(event))
@@ -184,16 +183,29 @@ class TauTriggerChecks(Module):
         self.out.fillBranch("trigger_SingleElectron", self.triggers['SingleElectron'].fired(event))
         self.out.fillBranch("trigger_SingleMuon",     self.triggers['SingleMuon'].fired(event))
         for filter in self.unique_filters:
-          for wpbit, wp in self.objectIDWPs[filter.id]:
-            wptag = "" if wp=='all' else '_'+wp
-            self.out.fillBranch("n%s_%s%s"%(filter.collection,filter.name,wptag),nMatches[filter][wpbit])
+          self.fillMatchBranches(filter,nMatches[filter],self.objectIDWPs[filter.id])
         for pair in nPairMatches:
-          for wpbit, wp in self.objectIDWPs[15]:
-            wptag = "" if wp=='all' else '_'+wp
-            self.out.fillBranch("nPair_%s%s"%(pair.name,wptag
-            ),nPairMatches[pair][wpbit])
+          self.fillMatchBranches(pair,nPairMatches[pair],self.objectIDWPs[15])
+        
+        # COUNT MATCH FRACTIONS
+        for key, nmatches in nMatches.items()+nPairMatches.items():
+          if nmatches[0]>=0:
+            self.nobjects[key] = self.nobjects.get(key,0)+1
+            if nmatches[0]>0:
+              self.nmatched[key] = self.nmatched.get(key,0)+1
+              if key in nMatches:
+                self.nmatchobjs += nmatches[0]
         return True
         
+    def printMatchFractions(self):
+        """Print the fraction of events with trigger objects that have at least one matched object,
+        per filter and pair of filters, with their Clopper-Pearson errors."""
+        print ">>> match fractions of events with trigger objects:"
+        for filter in self.unique_filters:
+          print ">>>   %-40s %s"%(filter.name,formatEff(self.nmatched.get(filter,0),self.nobjects.get(filter,0)))
+        for pair in self.filterpairs:
+          print ">>>   %-40s %s"%(pair.name,formatEff(self.nmatched.get(pair,0),self.nobjects.get(pair,0)))
+        
 
 
 # POST-PROCESSOR
@@ -204,6 +216,14 @@ postfix   = '_trigger_%s'%(year)
 branchsel = "python/keep_and_drop_taus.txt"
 if not os.path.isfile(branchsel): branchsel = None
 plot      = True #and False
+ncores    = 4 # processes to render plots
+encoding  = 'int' # of the number of matches in the output: 'int', 'uint8' or 'packed' (4 bits per WP)
+quick     = 0 # quick look: only process one in every N basket clusters of each file
+if quick>1: postfix += '_quick%d'%quick
+metrics   = None # JSON-lines file for throughput and resource metrics, e.g. "metrics/matchTau.jsonl"
+promfile  = None # Prometheus textfile with the latest metrics
+memcheck  = 0    # report the memory growth of python and ROOT objects every N events
+maxrss    = None # stop with a memory report if the RSS exceeds this bound (in MB)
 
 if year==2017:
   infiles = [
@@ -236,22 +256,37 @@ infiles = infiles[:nFiles]
 print ">>> %-10s = %s"%('year',year)
 print ">>> %-10s = %s"%('maxEvts',maxEvts)
 print ">>> %-10s = %s"%('nFiles',nFiles)
+print ">>> %-10s = %s"%('quick',quick)
+print ">>> %-10s = '%s'"%('encoding',encoding)
 print ">>> %-10s = '%s'"%('postfix',postfix)
 print ">>> %-10s = %s"%('infiles',infiles)
 print ">>> %-10s = %s"%('branchsel',branchsel)
 
 #module2run = lambda: TauTriggerChecks(year,trigger)
-module = TauTriggerChecks(year)
+module  = TauTriggerChecks(year,encoding=encoding)
+modules = [module]
+if quick>1:
+  sampler = ClusterSampler(quick) # first, so the other modules skip the unsampled clusters
+  modules.insert(0,sampler)
+if metrics:
+  monitor = MetricsMonitor(metrics,promfile=promfile,counters={'matched': lambda: module.nmatchobjs})
+  modules.insert(-1,monitor) # after the sampler, so only processed events are counted
+if memcheck>0:
+  modules.insert(0,MemoryTracker(memcheck,maxrss=maxrss))
 p = PostProcessor(".", infiles, None, branchsel=branchsel, outputbranchsel=branchsel, noOut=False,
-                  modules=[module], provenance=False, postfix=postfix, maxEntries=maxEvts)
+                  modules=modules, provenance=False, postfix=postfix, maxEntries=maxEvts)
 p.run()
+if quick>1:
+  print ">>> quick look: sampled %d/%d events (%.1f%%) in one of every %d clusters"%(
+          sampler.nsampled,sampler.nevents,100.0*sampler.fraction(),quick)
+module.printMatchFractions()
 
 
 
 # PLOT
 if plot:
   
-  def plotMatches(tree,basebranch,trigger,WPs,plotname,header,ctexts):
+  def fillMatches(tree,basebranch,trigger,WPs):
       gStyle.SetOptTitle(True)
       hists = [ ]
       for i, wp in enumerate(WPs,1):
@@ -291,7 +326,8 @@ if plot:
           hist.GetXaxis().SetTitleSize(0.044)
         hist.SetLineWidth(2)
         hist.SetLineColor(i)
-        out = tree.Draw("%s >> %s"%(branch,histname),"trigger_%s"%trigger,'gOff')
+        expr = matchExpr(basebranch,WPs,wp,module.encoding) # decode number of matches
+        out  = tree.Draw("%s >> %s"%(expr,histname),"trigger_%s"%trigger,'gOff')
         if hist.Integral()>0:
           hist.Scale(1./hist.Integral())
         else:
@@ -302,6 +338,9 @@ if plot:
         ###canvas.Close()
         hists.append(hist)
       gStyle.SetOptTitle(False)
+      return hists
+  
+  def plotMatches(hists,header,ctexts):
       canvas   = TCanvas('canvas','canvas',100,100,800,600)
       canvas.SetMargin(0.10,0.09,0.18,0.03)
       textsize = 0.040
@@ -328,11 +367,7 @@ if plot:
         textsize = 0.031 if i>0 else 0.044
         latex.SetTextSize(textsize)
         latex.DrawLatex(0.14,0.95-1.7*i*textsize,text)
-      canvas.SaveAs(plotname+".png")
-      canvas.SaveAs(plotname+".pdf")
-      canvas.Close()
-      for hist in hists:
-        gDirectory.Delete(hist.GetName())
+      return canvas, legend, latex
   
   filename = infiles[0].split('/')[-1].replace(".root",postfix+".root")
   file     = TFile(filename)
@@ -340,6 +375,7 @@ if plot:
   outdir   = ensureDirectory('plots')
   WPs      = { id: [w[1] for w in wps] for id, wps in module.objectIDWPs.iteritems() }
   triggers = ['etau','mutau','ditau']
+  queue    = PlotQueue(ncores=ncores,cachefile="%s/.plothashes.json"%(outdir))
   
   # PLOT FILTERS
   for filter in module.filters:
@@ -355,7 +391,8 @@ if plot:
     plotname = "%s/%s_%s_comparison_%d"%(outdir,trigger,branch,year)
     ctexts   = ["%s channel, %s trigger-reco object matching"%(channel,"#tau_{h}" if id==15 else object.lower())] +\
                ['|| '+t if i>0 else t for i, t in enumerate(filter.trigpaths)]
-    plotMatches(tree,branch,trigger,WPs[id],plotname,header,ctexts)
+    hists    = fillMatches(tree,branch,trigger,WPs[id])
+    queue.add(plotMatches,hists,plotname,header,ctexts)
   
   # PLOT PAIRS
   for pair in module.filterpairs:
@@ -367,7 +404,9 @@ if plot:
     channel  = trigger.replace('mu',"#mu").replace('di',"tau").replace('tau',"#tau_{h}")
     plotname = "%s/%s_%s_comparison_%d"%(outdir,trigger,branch,year)
     ctexts   = ["%s trigger-reco object matching"%channel,pair.trigpath]
-    plotMatches(tree,branch,trigger,WPs[15],plotname,header,ctexts)
+    hists    = fillMatches(tree,branch,trigger,WPs[15])
+    queue.add(plotMatches,hists,plotname,header,ctexts)
+  queue.run()
   
   file.Close()
   
@@ -0,0 +1,204 @@
+#! /usr/bin/env python
+# Description: Diff HLT menus or global tags: added, removed and renamed (new version) paths, and changed last filters.
+#              Menus are read from the menu cache (checkTriggers_cfg.py cache=<dir>),
+#              JSON summaries (json=<file>) or logs of the TriggerChecks plugin.
+import os, re
+import numpy as np
+from fnmatch import fnmatchcase
+from menuTools import loadMenuJSON
+from logIndex import parseLog
+
+versionexp = re.compile(r"_v\d+$")
+
+
+class NameTable:
+    """Intern path and filter names to integer IDs, and keep the ID of the version-stripped name of each path."""
+
+    def __init__(self):
+        self.names  = [ ] # ID -> name
+        self.ids    = { } # name -> ID
+        self.shorts = [ ] # ID -> ID of name without version label
+
+    def id(self,name):
+        """Get (or create) the ID of a name."""
+        id = self.ids.get(name,None)
+        if id==None:
+          id = len(self.names)
+          self.ids[name] = id
+          self.names.append(name)
+          self.shorts.append(id)
+          short = versionexp.sub('',name)
+          if short!=name:
+            self.shorts[id] = self.id(short)
+        return id
+
+    def shortof(self,ids):
+        """Get the IDs of the version-stripped names."""
+        return np.asarray(self.shorts,dtype=np.int32)[ids]
+
+
+class Menu:
+    """Paths of a menu (or global tag) as sorted arrays of interned IDs, with the last filters of each path."""
+
+    def __init__(self,label,paths,table):
+        """paths: dictionary of path -> list of last filters."""
+        self.label   = label
+        self.table   = table
+        self.paths   = np.unique(np.fromiter((table.id(p) for p in paths),dtype=np.int32,count=len(paths)))
+        self.shorts  = table.shortof(self.paths) # aligned with self.paths
+        self.filters = { } # short path ID -> tuple of last filter IDs
+        for path, filters in paths.iteritems():
+          self.filters[table.shorts[table.ids[path]]] = tuple(table.id(f) for f in filters)
+        lastids      = np.fromiter((table.id('\n'.join(paths[table.names[i]])) for i in self.paths),
+                                   dtype=np.int32,count=len(self.paths)) # interned combination of last filters
+        order        = np.argsort(self.shorts,kind='mergesort')
+        self.shortset, first = np.unique(self.shorts[order],return_index=True)
+        self.lastids = lastids[order][first] # aligned with self.shortset
+
+    def __repr__(self):
+        """Returns string representation of Menu object."""
+        return "<%s(%r,%d paths) at %s>"%(self.__class__.__name__,self.label,len(self.paths),hex(id(self)))
+
+    def fullnames(self,shorts):
+        """Get the full path IDs for some version-stripped path IDs."""
+        return self.paths[np.in1d(self.shorts,shorts)]
+
+
+def diffMenus(menu1,menu2):
+    """Compare two menus, and return a dictionary with lists of names:
+      'added':   new paths in menu2 (without version label)
+      'removed': paths of menu1 missing in menu2 (without version label)
+      'renamed': (old, new) pairs of paths with a different version label
+      'changed': (path, old filters, new filters) of common paths with different last filters
+    """
+    table   = menu1.table
+    names   = table.names
+    added   = np.setdiff1d(menu2.shortset,menu1.shortset,assume_unique=True)
+    removed = np.setdiff1d(menu1.shortset,menu2.shortset,assume_unique=True)
+    common  = np.intersect1d(menu1.shortset,menu2.shortset,assume_unique=True)
+    oldfull = np.setdiff1d(menu1.paths,menu2.paths,assume_unique=True)
+    renamed = np.intersect1d(table.shortof(oldfull),common)
+    result  = {
+      'added':   [names[i] for i in added],
+      'removed': [names[i] for i in removed],
+      'renamed': [ ],
+      'changed': [ ],
+    }
+    if len(renamed):
+      oldnames = { table.shorts[i]: names[i] for i in menu1.fullnames(renamed) }
+      newnames = { table.shorts[i]: names[i] for i in menu2.fullnames(renamed) }
+      result['renamed'] = [(oldnames[i],newnames[i]) for i in renamed]
+    last1   = menu1.lastids[np.searchsorted(menu1.shortset,common)]
+    last2   = menu2.lastids[np.searchsorted(menu2.shortset,common)]
+    for i in common[last1!=last2]:
+      result['changed'].append((names[i],[names[f] for f in menu1.filters[i]],[names[f] for f in menu2.filters[i]]))
+    for key in ['added','removed','renamed','changed']:
+      result[key].sort()
+    return result
+
+
+def loadMenuCache(filename):
+  """Load a menu cached by the TriggerChecks plugin (menuCacheDir).
+  Returns the menu name, and a dictionary of path -> last filter (before the final hltBoolEnd)."""
+  tableName = os.path.basename(filename)
+  paths = { }
+  path, last1, last2 = None, None, None # only keep last two module lines of each path
+  with open(filename,'r') as file:
+    for line in file:
+      if line.startswith('module '):
+        last2, last1 = last1, line
+      elif line.startswith('path '):
+        if path:
+          paths[path] = [last2.split()[1]] if last2 else [ ]
+        path, last1, last2 = line.split()[1], None, None
+      elif line.startswith('tableName '):
+        tableName = line.split()[1]
+  if path:
+    paths[path] = [last2.split()[1]] if last2 else [ ]
+  return tableName, paths
+
+
+def loadMenus(filenames,table,pattern=None,verbose=False):
+  """Load menus (from menu cache files) or global tags (from JSON summaries or logs),
+  in order of appearance, optionally only keeping paths matching a pattern."""
+  units = [ ] # list of (label, dictionary of path -> last filters)
+  for filename in filenames:
+    if not os.path.isfile(filename):
+      raise OSError('File in path "%s" does not exist!'%(filename))
+    if filename.endswith('.json'):
+      summary = loadMenuJSON(filename,verbose=verbose)
+      for globalTag in summary['globalTags']:
+        units.append((globalTag,summary['lastFilters'].get(globalTag,{ })))
+    elif filename.endswith('.log'):
+      menus, entries = parseLog(filename)
+      globalTags = [ ]
+      paths = { }
+      for globalTag, path, filter, highlight, type, position in entries:
+        if globalTag not in paths:
+          globalTags.append(globalTag)
+        filters = paths.setdefault(globalTag,{ }).setdefault(path,[ ])
+        if not highlight:
+          filters.append(filter)
+      units.extend((g,paths[g]) for g in globalTags)
+    else:
+      units.append(loadMenuCache(filename))
+  menus = [ ]
+  for label, paths in units:
+    if pattern:
+      paths = { p: f for p, f in paths.iteritems() if any(fnmatchcase(p,x) for x in pattern) }
+    menus.append(Menu(label,paths,table))
+  return menus
+
+
+def printDiff(menu1,menu2,diff,verbose=True):
+  """Print the differences between two menus."""
+  print ">>> %s -> %s: %d added, %d removed, %d renamed, %d changed last filters"%(menu1.label,menu2.label,
+          len(diff['added']),len(diff['removed']),len(diff['renamed']),len(diff['changed']))
+  if not verbose:
+    return
+  names = menu1.table.names
+  ids   = menu1.table.ids
+  for path in diff['added']:
+    print ">>>   + %-70s %s"%(path,' '.join(names[f] for f in menu2.filters.get(ids[path],( ))))
+  for path in diff['removed']:
+    print ">>>   - %-70s %s"%(path,' '.join(names[f] for f in menu1.filters.get(ids[path],( ))))
+  for oldpath, newpath in diff['renamed']:
+    print ">>>   ~ %s -> %s"%(oldpath,newpath)
+  for path, oldfilters, newfilters in diff['changed']:
+    print ">>>   * %-70s %s -> %s"%(path,' '.join(oldfilters) or '-',' '.join(newfilters) or '-')
+
+
+def main(args):
+  table = NameTable()
+  menus = loadMenus(args.infiles,table,pattern=args.paths,verbose=args.verbose)
+  if args.ref:
+    refs = [m for m in menus if m.label==args.ref]
+    if not refs:
+      raise KeyError("Did not find reference '%s' in %s"%(args.ref,[m.label for m in menus]))
+    pairs = [(refs[0],m) for m in menus if m is not refs[0]]
+  else: # consecutive menus
+    pairs = zip(menus[:-1],menus[1:])
+  print ">>> Loaded %d menus with %d names"%(len(menus),len(table.names))
+  for menu1, menu2 in pairs:
+    diff = diffMenus(menu1,menu2)
+    printDiff(menu1,menu2,diff,verbose=not args.summary)
+
+
+
+if __name__ == '__main__':
+  from argparse import ArgumentParser
+  description = """Diff HLT menus or global tags from the menu cache, JSON summaries or logs of the TriggerChecks plugin."""
+  parser = ArgumentParser(prog="menuDiff.py",description=description,epilog="Good luck!")
+  parser.add_argument('infiles',         nargs='+',
+                                         help="menu cache (.txt), JSON summary (.json) or log (.log) files" )
+  parser.add_argument('-r', '--ref',     default=None,
+                                         help="compare all menus to this reference menu or global tag (default: consecutive ones)" )
+  parser.add_argument('-p', '--path',    dest='paths', nargs='+', default=[ ],
+                                         help="only compare paths matching these patterns (wildcards allowed)" )
+  parser.add_argument('-s', '--summary', action='store_true',
+                                         help="only print the number of differences" )
+  parser.add_argument('-v', '--verbose', action='store_true',
+                                         help="set verbose" )
+  args = parser.parse_args()
+  main(args)
+
@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# Description: Tools to load the JSON summaries of HLT menus written by the TriggerChecks plugin
+#              (cmsRun python/checkTriggers_cfg.py json=<file>)
+import os, json
+from collections import OrderedDict
+
+
+def loadMenuJSON(*filenames,**kwargs):
+  """Load one or more JSON summaries from the TriggerChecks plugin, and merge them.
+  The format is as follows:
+    'globalTags'     -> list of global tags in order of appearance
+    'menus'          -> global tag -> list of HLT menu names
+    'filters'        -> global tag -> path -> list of filters as in the printed summary
+    'lastFilters'    -> global tag -> path -> ordered list of last filters
+    'checkedFilters' -> global tag -> path -> highlighted filter -> type label
+    'pathCounts'     -> 'paths': list of counted paths, 'available': run -> list of paths in menu,
+                        'lumis': list of [ run, lumi, events, [ accepts per path ] ] (optional)
+  """
+  verbose = kwargs.get('verbose',False)
+  summary = { 'globalTags': [ ], 'menus': { }, 'filters': { }, 'lastFilters': { }, 'checkedFilters': { } }
+  for filename in filenames:
+    if not os.path.isfile(filename):
+      raise OSError('File in path "%s" does not exist!'%(filename))
+    if verbose:
+      print ">>> loadMenuJSON: loading '%s'"%(filename)
+    with open(filename,'r') as file:
+      data = json.load(file)
+    mergeMenuSummary(summary,data)
+  return summary
+
+
+def mergeMenuSummary(summary,data):
+  """Merge the summary data of another job into summary.
+  The filters of menus with the same global tag in different jobs are combined."""
+  for globalTag in data['globalTags']:
+    if globalTag not in summary['globalTags']:
+      summary['globalTags'].append(globalTag)
+  for globalTag, menus in data['menus'].iteritems():
+    oldmenus = summary['menus'].setdefault(globalTag,[ ])
+    oldmenus.extend(m for m in menus if m not in oldmenus)
+  for key in ['filters','lastFilters']:
+    for globalTag, paths in data[key].iteritems():
+      oldpaths = summary[key].setdefault(globalTag,{ })
+      for path, filters in paths.iteritems():
+        oldfilters = oldpaths.setdefault(path,[ ])
+        oldfilters.extend(f for f in filters if f not in oldfilters)
+  for globalTag, paths in data['checkedFilters'].iteritems():
+    oldpaths = summary['checkedFilters'].setdefault(globalTag,{ })
+    for path, filters in paths.iteritems():
+      oldpaths.setdefault(path,{ }).update(filters)
+  if 'pathCounts' in data:
+    counts   = summary.setdefault('pathCounts',{ 'paths': [ ], 'available': { }, 'lumis': [ ] })
+    paths    = counts['paths']
+    columns  = [ ] # column in data -> column in summary
+    for path in data['pathCounts']['paths']:
+      if path not in paths:
+        paths.append(path)
+      columns.append(paths.index(path))
+    for run, available in data['pathCounts']['available'].iteritems():
+      oldavailable = counts['available'].setdefault(run,[ ])
+      oldavailable.extend(p for p in available if p not in oldavailable)
+    lumis = OrderedDict(((r,l),[n,c]) for r, l, n, c in counts['lumis'])
+    for run, lumi, nevents, accepts in data['pathCounts']['lumis']:
+      oldcounts = lumis.setdefault((run,lumi),[0,[ ]])
+      oldcounts[0] += nevents
+      oldcounts[1].extend([0]*(len(paths)-len(oldcounts[1])))
+      for column, naccepts in zip(columns,accepts):
+        oldcounts[1][column] += naccepts
+    counts['lumis'] = sorted([r,l,n,c+[0]*(len(paths)-len(c))] for (r,l), (n,c) in lumis.iteritems())
+  return summary
+
+
+def getLastFilters(summary,path,globalTags=None):
+  """Get the set of last filters of a path (without version label) over all (or some) global tags."""
+  filters = set()
+  for globalTag in (globalTags or summary['globalTags']):
+    filters.update(summary['lastFilters'].get(globalTag,{ }).get(path,[ ]))
+  return filters
+
+
+def printMenuSummary(summary):
+  """Print the summary like the TriggerChecks plugin does in endJob."""
+  
+  # MENUS PER GLOBAL TAG
+  print "\n  %s Summary of trigger menus %s"%('*'*4,'*'*28)
+  for globalTag in summary['globalTags']:
+    print "  *%56s*"%(' ')
+    print "  *   \033[1m%-53s\033[0m*"%(globalTag)
+    for tableName in sorted(summary['menus'].get(globalTag,[ ])):
+      print "  *     %-51s*"%(tableName)
+  print "  *%56s*"%(' ')
+  print "  %s"%('*'*58)
+  
+  # FILTERS PER TRIGGER
+  filtersAll = { }
+  for globalTag in summary['globalTags']:
+    for path, filters in summary['filters'].get(globalTag,{ }).iteritems():
+      filtersAll.setdefault(path,set()).update(filters)
+  for globalTag in summary['globalTags']+['All']:
+    paths = filtersAll if globalTag=='All' else summary['filters'].get(globalTag,{ })
+    print "\n  %s Summary of filters per trigger in '\033[1m%s\033[0m' %s"%('*'*4,globalTag,'*'*abs(50-len(globalTag)))
+    for path in sorted(paths):
+      print "  *%90s*"%(' ')
+      print "  *   %-87s*"%(path)
+      for filter in sorted(set(paths[path])):
+        print "  *     %-85s*"%(filter)
+    print "  *%90s*"%(' ')
+    print "  %s"%('*'*92)
+  
+  # PATH ACCEPTS PER RUN
+  if 'pathCounts' in summary:
+    paths = summary['pathCounts']['paths']
+    runs  = OrderedDict()
+    for run, lumi, nevents, accepts in sorted(summary['pathCounts']['lumis']):
+      counts = runs.setdefault(run,[0]*(len(paths)+1))
+      counts[0] += nevents
+      for i, naccepts in enumerate(accepts,1):
+        counts[i] += naccepts
+    print "\n  %s Summary of path accepts per run %s"%('*'*4,'*'*55)
+    for run, counts in runs.iteritems():
+      available = summary['pathCounts']['available'].get(str(run),[ ])
+      print "  *%90s*"%(' ')
+      print "  *   \033[1m%-87s\033[0m*"%("Run %d: %d events"%(run,counts[0]))
+      for i, path in enumerate(paths,1):
+        if path in available:
+          line = "%-66s%10d%8.2f%%"%(path,counts[i],100.0*counts[i]/counts[0] if counts[0]>0 else 0.0)
+        else:
+          line = "%-66s%19s"%(path,"not in menu")
+        print "  *     %-85s*"%(line)
+    print "  *%90s*"%(' ')
+    print "  %s"%('*'*92)
+  
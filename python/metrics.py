@@ -0,0 +1,236 @@
+#! /usr/bin/env python
+# Description: Monitor the throughput and resources (events/s, matched objects/s, bytes read, RSS, open files)
+#              of nanoAOD post-processing jobs, and export them periodically as JSON lines and a Prometheus textfile;
+#              track the memory growth of python and ROOT objects in long runs
+import os, time, json, socket, gc
+from collections import Counter
+from ROOT import gROOT, gDirectory
+from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
+
+prefix = 'tautrigger' # prefix of Prometheus metrics
+try:
+  import tracemalloc # python 3
+except ImportError:
+  tracemalloc = None
+
+
+def getRSS():
+  """Resident set size of this process in bytes, from /proc (Linux only)."""
+  try:
+    with open('/proc/self/status','r') as file:
+      for line in file:
+        if line.startswith('VmRSS:'):
+          return 1024*int(line.split()[1]) # kB
+  except IOError:
+    pass
+  return -1
+
+
+def getOpenFiles():
+  """Number of open file descriptors of this process, from /proc (Linux only)."""
+  try:
+    return len(os.listdir('/proc/self/fd'))
+  except OSError:
+    return -1
+
+
+class MetricsMonitor(Module):
+    """Count the processed events, and periodically append a record of the rates and resources to a JSON-lines file,
+    and (optionally) rewrite a Prometheus textfile with the latest values. A record of type 'progress' is written
+    every interval seconds, one of type 'file' at the end of each file, and one of type 'job' at the end.
+    Other counters (e.g. matched objects) can be monitored with a dictionary of name -> function returning the total.
+    Put it after any module that skips events (like ClusterSampler), so only processed events are counted."""
+
+    def __init__(self,jsonfile,promfile=None,interval=60,counters={ },worker=None,verbose=True):
+        self.jsonfile  = jsonfile
+        self.promfile  = promfile
+        self.interval  = interval # seconds between progress records
+        self.counters  = counters # name -> function returning total count
+        self.worker    = worker or os.environ.get('WORKER',"%s:%d"%(socket.gethostname(),os.getpid()))
+        self.verbose   = verbose
+        self.nevents   = 0 # events in the job
+        self.nbytes    = 0 # bytes read in closed files
+        self.filename  = None
+        self.file      = None
+        self.out       = None
+        dirname = os.path.dirname(jsonfile)
+        if dirname and not os.path.exists(dirname):
+          os.makedirs(dirname)
+
+    def beginJob(self,histFile=None,histDirName=None):
+        """Open the JSON-lines file, and start the clock."""
+        self.out       = open(self.jsonfile,'a')
+        self.start     = time.time()
+        self.last      = self.start # time of last progress record
+        self.lastcount = self.count() # totals at last progress record
+        self.startcount = self.lastcount
+
+    def endJob(self):
+        """Write the record of the whole job, and close the JSON-lines file."""
+        self.record('job',self.start,self.startcount,self.nbytes)
+        self.out.close()
+        if self.verbose:
+          print ">>> MetricsMonitor: written metrics to '%s'"%(self.jsonfile)
+
+    def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
+        """Reset the counters of this file."""
+        self.file      = inputFile
+        self.filename  = inputFile.GetName()
+        self.filestart = time.time()
+        self.filecount = self.count()
+
+    def endFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
+        """Write the record of this file."""
+        self.record('file',self.filestart,self.filecount,self.bytesRead())
+        self.nbytes   += self.bytesRead()
+        self.file      = None
+
+    def analyze(self, event):
+        """Count event, and write a progress record if it is time."""
+        self.nevents += 1
+        if self.nevents%100==0:
+          now = time.time()
+          if now-self.last>=self.interval:
+            self.record('progress',self.last,self.lastcount,self.nbytes+self.bytesRead(),now=now)
+            self.last      = now
+            self.lastcount = self.count()
+        return True
+
+    def bytesRead(self):
+        """Bytes read from the current input file."""
+        return self.file.GetBytesRead() if self.file else 0
+
+    def count(self):
+        """Totals of the events and other counters."""
+        totals = { 'events': self.nevents }
+        for name, function in self.counters.iteritems():
+          totals[name] = function()
+        return totals
+
+    def record(self,type,since,counts,nbytes,now=None):
+        """Write a record with the totals and rates since some time and counts."""
+        now     = now or time.time()
+        elapsed = max(now-since,1e-9)
+        totals  = self.count()
+        record  = { 'type': type, 'time': now, 'worker': self.worker, 'file': self.filename, 'elapsed': elapsed,
+                    'bytes_read': nbytes, 'rss': getRSS(), 'open_files': getOpenFiles() }
+        for name, total in totals.iteritems():
+          record[name] = total-counts[name] if type=='file' else total
+          record[name+'_per_s'] = (total-counts[name])/elapsed
+        self.out.write(json.dumps(record,sort_keys=True)+'\n')
+        self.out.flush()
+        if self.promfile:
+          self.writeProm(record,totals)
+        if self.verbose and type!='progress':
+          print ">>> MetricsMonitor: %s: %.1f events/s, %.1f MB read, %.1f MB RSS"%(
+                  type,record['events_per_s'],nbytes/1e6,record['rss']/1e6)
+
+    def writeProm(self,record,totals):
+        """Rewrite the Prometheus textfile with the latest values (atomically)."""
+        labels  = 'worker="%s",file="%s"'%(self.worker,os.path.basename(self.filename or ""))
+        lines   = [ ]
+        for name in sorted(totals):
+          lines.append("# TYPE %s_%s_total counter"%(prefix,name))
+          lines.append("%s_%s_total{%s} %d"%(prefix,name,labels,totals[name]))
+          lines.append("# TYPE %s_%s_per_second gauge"%(prefix,name))
+          lines.append("%s_%s_per_second{%s} %.6g"%(prefix,name,labels,record[name+'_per_s']))
+        for name, metric, type in [('bytes_read','read_bytes_total','counter'),('rss','resident_memory_bytes','gauge'),
+                                   ('open_files','open_fds','gauge')]:
+          metric = "%s_%s"%(prefix,metric)
+          lines.append("# TYPE %s %s"%(metric,type))
+          lines.append("%s{%s} %d"%(metric,labels,record[name]))
+        tmpname = self.promfile+".tmp"
+        with open(tmpname,'w') as file:
+          file.write('\n'.join(lines)+'\n')
+        os.rename(tmpname,self.promfile)
+
+
+def countROOTObjects():
+  """Count the ROOT objects in memory (histograms in gDirectory, files, canvases, ...) per class."""
+  counts = Counter()
+  lists  = [('',gROOT.GetList()),('file:',gROOT.GetListOfFiles()),('canvas:',gROOT.GetListOfCanvases())]
+  if gDirectory.GetPath()!=gROOT.GetPath():
+    lists.append(('',gDirectory.GetList()))
+  for tag, objects in lists:
+    for obj in objects:
+      counts[tag+obj.ClassName()] += 1
+  return counts
+
+
+def countPythonObjects():
+  """Count the python objects tracked by the garbage collector per type (if tracemalloc is not available)."""
+  return Counter(type(o).__name__ for o in gc.get_objects())
+
+
+class MemoryTracker(Module):
+    """Take snapshots of the allocated python memory (with tracemalloc, or else the counts of python objects per type)
+    and of the ROOT objects in memory every N events, and report the largest growth since the first snapshot.
+    If maxrss (in MB) is given, raise a MemoryError with the report as soon as the RSS exceeds it."""
+
+    def __init__(self,every=10000,maxrss=None,ntop=10,verbose=True):
+        self.every    = every  # events between snapshots
+        self.maxrss   = maxrss # maximum RSS in MB
+        self.ntop     = ntop   # number of growth sites to report
+        self.verbose  = verbose
+        self.nevents  = 0
+        self.baseline = None   # first snapshot of (RSS, python, ROOT)
+
+    def beginJob(self,histFile=None,histDirName=None):
+        """Start tracing python memory allocations."""
+        if tracemalloc and not tracemalloc.is_tracing():
+          tracemalloc.start(10)
+
+    def endJob(self):
+        """Report the growth over the whole job."""
+        if self.baseline and self.nevents%self.every: # not reported yet
+          print self.report(self.snapshot())
+        if tracemalloc and tracemalloc.is_tracing():
+          tracemalloc.stop()
+
+    def analyze(self, event):
+        """Count event, and take a snapshot every N events."""
+        self.nevents += 1
+        if self.nevents%self.every==0:
+          self.check()
+        return True
+
+    def snapshot(self):
+        """Take a snapshot of the RSS (in MB), python memory and ROOT objects."""
+        gc.collect()
+        if tracemalloc:
+          python = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False,tracemalloc.__file__)])
+        else:
+          python = countPythonObjects()
+        return (getRSS()/1024.**2, python, countROOTObjects())
+
+    def check(self):
+        """Take a snapshot, compare it to the first one, and raise a MemoryError if the RSS is too large."""
+        snapshot = self.snapshot()
+        if self.baseline==None:
+          self.baseline = snapshot # after the first N events, to skip the initial allocations
+        elif self.verbose:
+          print self.report(snapshot)
+        if self.maxrss and snapshot[0]>self.maxrss:
+          raise MemoryError("RSS of %.1f MB exceeds the maximum of %.1f MB!\n%s"%(snapshot[0],self.maxrss,self.report(snapshot)))
+
+    def report(self,snapshot):
+        """Report the growth of RSS, the top python allocation sites (or types) and ROOT objects since the first snapshot."""
+        baseline = self.baseline or snapshot
+        rss, python, objects = snapshot
+        lines    = [">>> MemoryTracker: after %d events: RSS = %.1f MB (%+.1f MB)"%(self.nevents,rss,rss-baseline[0])]
+        if tracemalloc:
+          lines.append(">>>   top python allocation growth:")
+          for stat in python.compare_to(baseline[1],'lineno')[:self.ntop]:
+            lines.append(">>>     %s"%(stat))
+        else:
+          lines.append(">>>   top python object growth:")
+          growth = python.copy()
+          growth.subtract(baseline[1])
+          for name, count in growth.most_common(self.ntop):
+            if count<=0: break
+            lines.append(">>>     %-30s %+8d (%d)"%(name,count,python[name]))
+        lines.append(">>>   ROOT objects in memory:")
+        for name in sorted(set(objects)|set(baseline[2])):
+          lines.append(">>>     %-30s %8d (%+d)"%(name,objects[name],objects[name]-baseline[2][name]))
+        return '\n'.join(lines)
+
@@ -0,0 +1,119 @@
+#! /usr/bin/env python
+# Description: Queue of independent plots, rendered in a pool of worker processes,
+#              skipping plots whose outputs are up to date with the histogram contents and style
+import os, json, hashlib
+from multiprocessing import Pool
+from ROOT import gDirectory
+
+_jobs = [ ] # jobs of the running queue, inherited by the forked workers
+
+
+def hashHist(hist,md5):
+  """Update a md5 hash with the contents, binning, titles and line style of a histogram."""
+  xaxis = hist.GetXaxis()
+  nbins = xaxis.GetNbins()
+  md5.update(repr((hist.ClassName(),hist.GetTitle(),nbins,xaxis.GetXmin(),xaxis.GetXmax(),
+                   xaxis.GetTitle(),hist.GetYaxis().GetTitle(),hist.GetLineColor(),hist.GetLineWidth())))
+  md5.update(repr([(hist.GetBinContent(i),hist.GetBinError(i)) for i in xrange(nbins+2)]))
+  md5.update(repr([xaxis.GetBinLabel(i) for i in xrange(1,nbins+1)]))
+
+
+def hashPlot(function,hists,args,kwargs):
+  """Hash the histograms, the arguments and the code of the drawing function of a plot."""
+  md5 = hashlib.md5()
+  code = function.__code__
+  md5.update(code.co_code)
+  md5.update(repr(code.co_consts))
+  md5.update(repr((args,sorted(kwargs.items()))))
+  for hist in hists:
+    hashHist(hist,md5)
+  return md5.hexdigest()
+
+
+def renderPlot(index):
+  """Draw a queued plot, and save it in each format. Returns the plot name if successful."""
+  function, hists, plotname, exts, args, kwargs = _jobs[index]
+  try:
+    result = function(hists,*args,**kwargs) # keep drawn objects alive until saved
+    canvas = result[0] if isinstance(result,tuple) else result
+    for ext in exts:
+      canvas.SaveAs("%s.%s"%(plotname,ext))
+    canvas.Close()
+  except Exception as error:
+    print ">>> Warning! Failed to render '%s': %s"%(plotname,error)
+    return None
+  return plotname
+
+
+class PlotQueue:
+    """Queue plots, and render them in parallel. A plot is skipped if all its outputs exist
+    and its hash (histogram contents, arguments and drawing code) did not change since the last time,
+    as stored in a sidecar JSON file. Drawing functions take a list of histograms, and return a canvas,
+    or a tuple of a canvas and the drawn objects (legend, ...) that should be kept alive until it is saved."""
+
+    def __init__(self,ncores=1,cachefile='plots/.plothashes.json',exts=['png','pdf'],force=False,verbose=True):
+        self.ncores    = ncores
+        self.cachefile = cachefile
+        self.exts      = exts
+        self.force     = force
+        self.verbose   = verbose
+        self.jobs      = [ ] # list of (function, hists, plotname, exts, args, kwargs)
+        self.hashes    = { } # plotname -> hash of queued job
+        self.hists     = [ ] # all histograms, including those of skipped plots
+        self.cache     = { } # plotname -> hash of saved plot
+        self.nskipped  = 0
+        if os.path.isfile(cachefile):
+          with open(cachefile,'r') as file:
+            self.cache = json.load(file)
+
+    def __len__(self):
+        """Number of plots to render."""
+        return len(self.jobs)
+
+    def add(self,function,hists,plotname,*args,**kwargs):
+        """Queue a plot, unless it is up to date. Returns True if queued."""
+        hash = hashPlot(function,hists,args,kwargs)
+        self.hists.extend(hists)
+        if not self.force and self.cache.get(plotname,None)==hash and\
+           all(os.path.isfile("%s.%s"%(plotname,e)) for e in self.exts):
+          if self.verbose:
+            print ">>> Plot '%s' is up to date"%(plotname)
+          self.nskipped += 1
+          return False
+        self.jobs.append((function,hists,plotname,self.exts,args,kwargs))
+        self.hashes[plotname] = hash
+        return True
+
+    def run(self):
+        """Render all queued plots, update the hash cache, and delete the histograms."""
+        global _jobs
+        _jobs = self.jobs
+        if self.ncores>1 and len(self.jobs)>1:
+          pool  = Pool(min(self.ncores,len(self.jobs))) # fork after queueing
+          names = pool.map(renderPlot,xrange(len(self.jobs)))
+          pool.close()
+          pool.join()
+        else:
+          names = [renderPlot(i) for i in xrange(len(self.jobs))]
+        _jobs = [ ]
+        for plotname in names:
+          if plotname:
+            self.cache[plotname] = self.hashes[plotname]
+        if self.verbose:
+          print ">>> Rendered %d plots (%d up to date)"%(len([n for n in names if n]),self.nskipped)
+        self.write()
+        for hist in self.hists:
+          gDirectory.Delete(hist.GetName())
+        self.jobs, self.hashes, self.hists, self.nskipped = [ ], { }, [ ], 0
+        return names
+
+    def write(self):
+        """Write the hashes of the saved plots to the cache file."""
+        dirname = os.path.dirname(self.cachefile)
+        if dirname and not os.path.exists(dirname):
+          os.makedirs(dirname)
+        tmpname = self.cachefile+".tmp"
+        with open(tmpname,'w') as file:
+          json.dump(self.cache,file,indent=1,sort_keys=True)
+        os.rename(tmpname,self.cachefile)
+
@@ -0,0 +1,118 @@
+#! /usr/bin/env python
+# Description: Run the TriggerChecks plugin in several concurrent cmsRun jobs, one per year, data type and era,
+#              and merge their JSON summaries into one report, like the serial endJob summary
+import os, re, ast, json, time, subprocess
+from multiprocessing.pool import ThreadPool
+from collections import OrderedDict
+from menuTools import loadMenuJSON, printMenuSummary
+from utils import ensureDirectory
+
+mcyears = OrderedDict([('/RunIISummer16',2016),('/RunIIFall17',2017),('/RunIIAutumn18',2018)])
+dataexp = re.compile(r"/Run(20\d\d)([A-Z])")
+
+
+def getFilesFromConfig(cfgname):
+  """Get the default list of input files from the configuration, without running it."""
+  with open(cfgname,'r') as file:
+    tree = ast.parse(file.read(),cfgname)
+  for node in tree.body:
+    if isinstance(node,ast.Assign) and any(isinstance(t,ast.Name) and t.id=='files' for t in node.targets):
+      return ast.literal_eval(node.value)
+  raise KeyError("Did not find list of files in '%s'"%(cfgname))
+
+
+def getEra(filename):
+  """Get the year, data type and era of a file from its path."""
+  match = dataexp.search(filename)
+  if match:
+    return int(match.group(1)), 'data', match.group(2)
+  for campaign, year in mcyears.iteritems():
+    if campaign in filename:
+      return year, 'mc', ''
+  return 0, '', ''
+
+
+def partitionFiles(filenames,years=[ ],dtype=None):
+  """Group files by year, data type and era, keeping the order of the files."""
+  groups = OrderedDict()
+  for filename in filenames:
+    year, type, era = getEra(filename)
+    if years and year not in years: continue
+    if dtype and type!=dtype: continue
+    groups.setdefault((year,type,era),[ ]).append(filename)
+  return groups
+
+
+def runJob(job):
+  """Run a cmsRun job, and return its exit code."""
+  name, command, logname, jsonname = job
+  start = time.time()
+  with open(logname,'w') as log:
+    retcode = subprocess.call(command,stdout=log,stderr=subprocess.STDOUT)
+  print ">>> Job %-14s finished with exit code %d after %.1f s (log in '%s')"%(name,retcode,time.time()-start,logname)
+  return retcode
+
+
+def main(args):
+  cfgname   = args.config
+  outdir    = ensureDirectory(args.outdir)
+  filenames = args.infiles or getFilesFromConfig(cfgname)
+  groups    = partitionFiles(filenames,years=args.years,dtype=args.dtype)
+
+  # PREPARE JOBS
+  jobs = [ ]
+  for (year,dtype,era), files in groups.iteritems():
+    name     = "%s_%s%s"%(year,dtype,era)
+    jsonname = "%s/triggers_%s.json"%(outdir,name)
+    logname  = "%s/triggers_%s.log"%(outdir,name)
+    command  = ['cmsRun',cfgname,"inputFiles=%s"%(','.join(files)),"json=%s"%(jsonname)]+args.options
+    jobs.append((name,command,logname,jsonname))
+    print ">>> Job %-14s with %d files: %s"%(name,len(files),' '.join(command[:2]+command[3:]))
+
+  # RUN JOBS concurrently
+  start    = time.time()
+  pool     = ThreadPool(max(1,min(args.ncores,len(jobs))))
+  retcodes = pool.map(runJob,jobs)
+  pool.close()
+  print ">>> Ran %d jobs with %d cores in %.1f s"%(len(jobs),args.ncores,time.time()-start)
+  failed = [j[0] for j, r in zip(jobs,retcodes) if r!=0]
+  if failed:
+    print ">>> Warning! Jobs %s failed! Leaving them out of the summary..."%(', '.join(failed))
+
+  # MERGE SUMMARIES in order of the files
+  jsonnames = [j[3] for j, r in zip(jobs,retcodes) if r==0 and os.path.isfile(j[3])]
+  if not jsonnames:
+    print ">>> No summaries to merge!"
+    return
+  summary = loadMenuJSON(*jsonnames)
+  printMenuSummary(summary)
+  if args.outfile:
+    with open(args.outfile,'w') as file:
+      json.dump(summary,file,indent=2)
+    print ">>> Written merged summary to '%s'"%(args.outfile)
+
+
+
+if __name__ == '__main__':
+  from argparse import ArgumentParser
+  description = """Run python/checkTriggers_cfg.py in concurrent cmsRun jobs per year, data type and era, and merge the summaries."""
+  parser = ArgumentParser(prog="runCheckTriggers.py",description=description,epilog="Good luck!")
+  parser.add_argument('options',         nargs='*', default=[ ],
+                                         help="extra options passed to the configuration, e.g. nlast=2 trigger=HLT_IsoMu24" )
+  parser.add_argument('-c', '--config',  default='python/checkTriggers_cfg.py',
+                                         help="cmsRun configuration" )
+  parser.add_argument('-i', '--infiles', nargs='+', default=[ ],
+                                         help="input files (default: list in configuration)" )
+  parser.add_argument('-y', '--year',    dest='years', type=int, nargs='+', default=[ ],
+                                         help="only run over these years" )
+  parser.add_argument('-d', '--dtype',   choices=['data','mc'], default=None,
+                                         help="only run over this data type" )
+  parser.add_argument('-j', '--ncores',  type=int, default=4,
+                                         help="number of concurrent cmsRun jobs" )
+  parser.add_argument('-O', '--outdir',  default='output/jobs',
+                                         help="directory for the JSON summaries and logs of each job" )
+  parser.add_argument('-o', '--outfile', default=None,
+                                         help="write merged summary to this JSON file" )
+  args = parser.parse_args()
+  main(args)
+
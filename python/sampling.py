@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+# Description: Deterministic sampling of the basket clusters of nanoAOD files for quick-look runs,
+#              and Clopper-Pearson uncertainties of the resulting efficiencies
+import os, zlib
+import numpy as np
+from ROOT import TEfficiency
+from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
+
+
+def getClusters(tree):
+  """Get the list of (first, last+1) entries of the basket clusters of a tree."""
+  nentries = tree.GetEntries()
+  clusters = [ ]
+  iterator = tree.GetClusterIterator(0)
+  start    = iterator.Next()
+  while start<nentries:
+    end = min(iterator.GetNextEntry(),nentries)
+    if end<=start: break
+    clusters.append((start,end))
+    start = iterator.Next()
+  return clusters
+
+
+def sampleClusters(clusters,nsample,key):
+  """Select one in every nsample clusters, starting from an offset given by the CRC32 checksum of a key
+  (e.g. the file name), so the selection is reproducible between runs, but not aligned between files.
+  At least one cluster is selected."""
+  if nsample<=1:
+    return clusters[:]
+  offset   = (zlib.crc32(key)&0xffffffff)%nsample
+  selected = [c for i, c in enumerate(clusters) if (i+offset)%nsample==0]
+  if not selected and clusters:
+    selected = [clusters[offset%len(clusters)]]
+  return selected
+
+
+def clopperPearson(k,n,cl=0.682689):
+  """Efficiency k/n with its lower and upper Clopper-Pearson errors (one sigma by default)."""
+  if n<=0:
+    return 0.0, 0.0, 0.0
+  k, n = int(k), int(n)
+  eff  = float(k)/n
+  return eff, eff-TEfficiency.ClopperPearson(n,k,cl,False), TEfficiency.ClopperPearson(n,k,cl,True)-eff
+
+
+def formatEff(k,n):
+  """Format an efficiency k/n in percent with its Clopper-Pearson errors."""
+  eff, down, up = clopperPearson(k,n)
+  return "%d/%d = %.2f -%.2f +%.2f%%"%(k,n,100.0*eff,100.0*down,100.0*up)
+
+
+class ClusterSampler(Module):
+    """Only pass the events in one of every nsample basket clusters of each file, for quick-look runs.
+    Put it first in the list of modules, so the branches of skipped clusters are never read by the others."""
+
+    def __init__(self,nsample=20,verbose=True):
+        self.nsample  = nsample # sample one in nsample clusters
+        self.verbose  = verbose
+        self.nevents  = 0       # total number of events in the files
+        self.nsampled = 0       # number of sampled events
+        self.mask     = None    # entry -> sampled
+
+    def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
+        """Select the clusters of this file."""
+        clusters  = getClusters(inputTree)
+        selected  = sampleClusters(clusters,self.nsample,os.path.basename(inputFile.GetName()))
+        self.mask = np.zeros(inputTree.GetEntries(),dtype=bool)
+        for start, end in selected:
+          self.mask[start:end] = True
+        nsampled  = np.count_nonzero(self.mask)
+        self.nevents  += len(self.mask)
+        self.nsampled += nsampled
+        if self.verbose:
+          print ">>> ClusterSampler: sampling %d/%d clusters with %d/%d events of '%s'"%(
+                  len(selected),len(clusters),nsampled,len(self.mask),inputFile.GetName())
+
+    def analyze(self, event):
+        """Pass only the events in the sampled clusters."""
+        return bool(self.mask[event._entry])
+
+    def fraction(self):
+        """Fraction of sampled events."""
+        return float(self.nsampled)/self.nevents if self.nevents else 0.0
+
+
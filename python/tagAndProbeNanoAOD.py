@@ -0,0 +1,186 @@
+#! /usr/bin/env python
+# Description: Tag-and-probe of the tau leg of the mutau trigger in nanoAOD:
+#              a muon tag matched to the SingleMuon trigger, and a tau probe tested against the mutau tau leg
+# Source:
+#   https://github.com/cms-sw/cmssw/blob/master/PhysicsTools/NanoAOD/python/triggerObjects_cff.py
+#   https://cms-nanoaod-integration.web.cern.ch/integration/master-102X/mc102X_doc.html#TrigObj
+from array import array
+import ROOT; ROOT.PyConfig.IgnoreCommandLineOptions = True
+from ROOT import gROOT, TTree
+from utils import ensureDirectory, bold
+from PhysicsTools.NanoAODTools.postprocessing.framework.postprocessor import PostProcessor
+from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Collection
+from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
+from TrigObjMatcher import loadTriggerDataFromJSON, TrigObjMatcher, matchLegs
+from argparse import ArgumentParser
+usage = """Tag-and-probe of the tau leg of the mutau trigger in the nanoAOD post-processor."""
+parser = ArgumentParser(prog="tagAndProbeNanoAOD", description=usage, epilog="Succes!")
+parser.add_argument('-y', '--year',    type=int, choices=[2016,2017,2018],default=2018, action='store',
+                                       help="year" )
+parser.add_argument('-d', '--dtype',   type=str, choices=['mc','data'], default='data', action='store',
+                                       help="data type" )
+parser.add_argument('-n', '--nmax',    type=int, default=-1, action='store',
+                                       help="maximum number of events (per file)" )
+parser.add_argument('-f', '--nfiles',  type=int, default=1, action='store',
+                                       help="number of files to run over" )
+parser.add_argument('-i', '--infiles', type=str, nargs='+', default=[ ], action='store',
+                                       help="input files (overrides the default list)" )
+args     = parser.parse_args()
+director = 'root://xrootd-cms.infn.it/'
+gROOT.SetBatch(True)
+
+
+
+class TauTagAndProbe(Module):
+    """Build muon tag - tau probe pairs, and write one compact record per probe.
+    The pass flags of a probe are stored as bits:
+      1: the mutau trigger was fired
+      2: the probe is matched to the tau leg of the mutau trigger
+      4: the tag is matched to the muon leg of the mutau trigger
+    """
+
+    def __init__(self,year,dtype='data',verbose=True):
+
+        assert year in [2016,2017,2018], "Year should be 2016, 2017 or 2018"
+        assert dtype in ['mc','data'], "Wrong data type '%s'! It should be 'mc' or 'data'!"%dtype
+
+        isData       = dtype=='data'
+        jsonfile     = "json/tau_triggers_%d.json"%year
+        trigdata     = loadTriggerDataFromJSON(jsonfile,isData=isData,verbose=verbose)
+        tagmatcher   = TrigObjMatcher(trigdata.combdict['SingleMuon'])
+        probematcher = TrigObjMatcher(trigdata.combdict['mutau'])
+        print ">>> %s:"%bold("tag trigger object matcher")
+        print ">>>   '%s'"%(tagmatcher.path)
+        print ">>> %s:"%bold("probe trigger object matcher")
+        print ">>>   '%s'"%(probematcher.path)
+
+        self.muptmin      = 26 if year==2017 else 25
+        self.tauptmin     = 20
+        self.isData       = isData
+        self.verbose      = verbose
+        self.tagmatcher   = tagmatcher
+        self.probematcher = probematcher
+
+    def beginJob(self,histFile=None,histDirName=None):
+        """Create the probe tree, filled directly in the output file."""
+        Module.beginJob(self,histFile,histDirName)
+        self.dir.cd()
+        self.tree   = TTree('probes',"tau probes for the mutau trigger")
+        self.values = { }
+        for var, type, leaf in [('run','I','i'),('pt_tag','f','F'),('m_vis','f','F'),('pt','f','F'),('eta','f','F'),('phi','f','F'),
+                                ('dm','b','B'),('idDeepTau2017v2p1VSjet','B','b'),('pass','B','b')]:
+          self.values[var] = array(type,[0])
+          self.tree.Branch(var,self.values[var],"%s/%s"%(var,leaf))
+        self.addObject(self.tree)
+
+    def analyze(self, event):
+        """Process event, return True (pass, go to next module) or False (fail, go to next event)."""
+        tagfired = self.tagmatcher.firedTriggers(event) # evaluate each trigger only once per event
+        if not tagfired:
+          return False
+
+        # SELECT TAGS
+        tags = [ ]
+        for muon in Collection(event,'Muon'):
+          if muon.pt < self.muptmin: continue
+          if abs(muon.eta) > 2.1: continue
+          if abs(muon.dz) > 0.2: continue
+          if abs(muon.dxy) > 0.045: continue
+          if not muon.mediumId: continue
+          if muon.pfRelIso04_all > 0.15: continue
+          tags.append(muon)
+        if not tags:
+          return False
+
+        # SELECT PROBES
+        probes = [ ]
+        for tau in Collection(event,'Tau'):
+          if tau.pt < self.tauptmin: continue
+          if abs(tau.eta) > 2.1: continue
+          if abs(tau.dz) > 0.2: continue
+          if tau.decayMode not in [0,1,10,11]: continue
+          if tau.idDeepTau2017v2p1VSmu<8: continue # Tight
+          if tau.idDeepTau2017v2p1VSe<4: continue  # VLoose
+          probes.append(tau)
+        if not probes:
+          return False
+
+        # MATCH TAG & PROBE LEGS in one batch
+        (tagmatches, probematches, crossmatches), fired = matchLegs(event,[
+          (self.tagmatcher,  tags,  1),
+          (self.probematcher,probes,2),
+          (self.probematcher,tags,  1),
+        ],fired={ self.tagmatcher: tagfired })
+        fired = len(fired[self.probematcher])>0
+
+        # FILL PROBES
+        values = self.values
+        values['run'][0] = event.run
+        for tag, tagmatch, crossmatch in zip(tags,tagmatches,crossmatches):
+          if tagmatch==None: continue
+          tagp4 = tag.p4()
+          for tau, probematch in zip(probes,probematches):
+            if tau.charge*tag.charge>0: continue
+            if tau.DeltaR(tag)<0.5: continue
+            values['pt_tag'][0] = tag.pt
+            values['m_vis'][0]  = (tagp4+tau.p4()).M()
+            values['pt'][0]     = tau.pt
+            values['eta'][0]    = tau.eta
+            values['phi'][0]    = tau.phi
+            values['dm'][0]     = tau.decayMode
+            values['idDeepTau2017v2p1VSjet'][0] = tau.idDeepTau2017v2p1VSjet
+            values['pass'][0]   = int(fired) + 2*int(probematch!=None) + 4*int(crossmatch!=None)
+            self.tree.Fill()
+
+        return True
+
+
+
+# POST-PROCESSOR
+year      = args.year
+dtype     = args.dtype
+maxEvts   = args.nmax
+nFiles    = args.nfiles
+postfix   = "_tnp_%s_%s"%(year,dtype)
+outdir    = ensureDirectory("nanoAOD")
+outfile   = "%s/tagAndProbe_%s_%s.root"%(outdir,year,dtype)
+infiles   = args.infiles or [
+
+  # 2016 SingleMuon datasets
+  director+'/store/data/Run2016B_ver2/SingleMuon/NANOAOD/Nano25Oct2019_ver2-v1/20000/57AC2EEB-79CF-1940-9FDD-86017DE09B69.root',
+  director+'/store/data/Run2016C/SingleMuon/NANOAOD/Nano25Oct2019-v1/40000/ADE294FD-D468-EE40-9BAF-5129F05942A1.root',
+  director+'/store/data/Run2016D/SingleMuon/NANOAOD/Nano25Oct2019-v1/240000/A4A6C22B-6729-1B4B-A69B-327BD5C70D4C.root',
+  director+'/store/data/Run2016E/SingleMuon/NANOAOD/Nano25Oct2019-v1/20000/3BFD152F-D9BC-4540-810E-92939DD69EA4.root',
+  director+'/store/data/Run2016F/SingleMuon/NANOAOD/Nano25Oct2019-v1/30000/B18923B6-14E9-A84F-B20B-DDF942B5F3C5.root',
+  director+'/store/data/Run2016G/SingleMuon/NANOAOD/Nano25Oct2019-v1/40000/9D8EE183-A48A-BB47-ACFF-A06E0281400A.root',
+  director+'/store/data/Run2016H/SingleMuon/NANOAOD/Nano25Oct2019-v1/60000/0DE80F77-8D16-644A-8B60-752CEBAA16F0.root',
+
+  # 2017 SingleMuon datasets
+  director+'/store/data/Run2017B/SingleMuon/NANOAOD/Nano25Oct2019-v1/40000/AA6BBB35-FB22-BD44-AF45-A99DE6427B9A.root',
+  director+'/store/data/Run2017C/SingleMuon/NANOAOD/Nano25Oct2019-v1/230000/B3075A16-D1D5-7A47-AE93-FA2570FD7FF8.root',
+  director+'/store/data/Run2017D/SingleMuon/NANOAOD/Nano25Oct2019-v1/40000/E2E45B6D-CAEC-944B-A859-8561F68EDD7F.root',
+  director+'/store/data/Run2017E/SingleMuon/NANOAOD/Nano25Oct2019-v1/260000/85E75AE8-CE76-4A4C-85B8-E524F778EA5B.root',
+  director+'/store/data/Run2017F/SingleMuon/NANOAOD/Nano25Oct2019-v1/30000/A9FF8C0B-2ABC-1E42-BF9A-A205E23BC3A3.root',
+
+  # 2018 SingleMuon datasets
+  director+'/store/data/Run2018A/SingleMuon/NANOAOD/Nano25Oct2019-v1/20000/0B5A5B06-F545-5D45-AFFD-03C1245ABFA1.root',
+  director+'/store/data/Run2018B/SingleMuon/NANOAOD/Nano25Oct2019-v1/240000/2CD0A2F6-E2EC-9545-AA2D-C846ADB96F25.root',
+  director+'/store/data/Run2018C/SingleMuon/NANOAOD/Nano25Oct2019-v1/20000/D2F3F163-3DAA-6D43-8A07-1CEF72C53BB9.root',
+  director+'/store/data/Run2018D/SingleMuon/NANOAOD/Nano25Oct2019-v1/70000/B56197D5-60C7-2C42-9FB8-4C403F97B4B7.root',
+
+]
+if not args.infiles:
+  infiles = filter(lambda f: '/Run%d'%year in f,infiles)
+infiles = infiles[:nFiles]
+
+print ">>> %-10s = %s"%('year',year)
+print ">>> %-10s = '%s'"%('dtype',dtype)
+print ">>> %-10s = %s"%('maxEvts',maxEvts)
+print ">>> %-10s = %s"%('nFiles',nFiles)
+print ">>> %-10s = %s"%('infiles',infiles)
+print ">>> %-10s = '%s'"%('outfile',outfile)
+
+module = TauTagAndProbe(year,dtype=dtype,verbose=True)
+p = PostProcessor(outdir, infiles, None, noOut=True, histFileName=outfile, histDirName='tagAndProbe',
+                  modules=[module], provenance=False, postfix=postfix, maxEntries=maxEvts)
+p.run()
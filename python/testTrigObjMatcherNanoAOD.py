@@ -14,7 +14,11 @@ from utils import ensureDirectory, bold
 from PhysicsTools.NanoAODTools.postprocessing.framework.postprocessor import PostProcessor
 from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Collection
 from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
-from TrigObjMatcher import loadTriggerDataFromJSON, TrigObjMatcher
+from TrigObjMatcher import loadTriggerDataFromJSON, TrigObjMatcher, TrigObjMatcherBank
+from plotTools import PlotQueue
+from branchReader import NanoArrayReader
+from sampling import ClusterSampler, formatEff
+from metrics import MetricsMonitor, MemoryTracker
 from argparse import ArgumentParser
 usage = """Test 'TrigObjMatcher' class in nanoAO post-processor."""
 parser = ArgumentParser(prog="testTrigObjMatcherNanoAOD", description=usage, epilog="Succes!")
@@ -30,8 +34,22 @@ parser.add_argument('-f', '--nfiles',  type=int, default=1, action='store',
                                        help="number of files to run over" )
 parser.add_argument('-s', '--sample',  type=str, default=None, action='store',
                                        help="sample pattern" )
+parser.add_argument('-q', '--quick',   type=int, default=0, action='store', metavar='N',
+                                       help="quick look: only process one in N basket clusters of each file" )
+parser.add_argument('-m', '--metrics', type=str, default=None, action='store', metavar='FILE',
+                                       help="append throughput and resource metrics to a JSON-lines file" )
+parser.add_argument('-P', '--prom',    type=str, default=None, action='store', metavar='FILE',
+                                       help="also write the latest metrics to a Prometheus textfile" )
+parser.add_argument('-M', '--memcheck', type=int, default=0, action='store', metavar='N',
+                                       help="report the memory growth of python and ROOT objects every N events" )
+parser.add_argument('--maxrss',        type=float, default=None, action='store', metavar='MB',
+                                       help="with -M, stop with a memory report if the RSS exceeds this bound" )
 parser.add_argument('-o', '--plot',    dest='run', default=True, action='store_false',
-                                       help="plot only, without running the post-processor" )
+                                       help="plot only, from the summary histograms, without running the post-processor" )
+parser.add_argument('-j', '--ncores',  type=int, default=4, action='store',
+                                       help="number of processes to render plots" )
+parser.add_argument('-F', '--force',   default=False, action='store_true',
+                                       help="redraw all plots, even if they are up to date" )
 args      = parser.parse_args()
 director = 'root://xrootd-cms.infn.it/'
 gROOT.SetBatch(True)
@@ -44,7 +62,7 @@ gStyle.SetEndErrorSize(5)
 
 class TauTriggerChecks(Module):
     
-    def __init__(self,year,dtype='mc',verbose=True):
+    def __init__(self,year,dtype='mc',precompute=True,nmax=-1,verbose=True):
         
         assert year in [2016,2017,2018], "Year should be 2016, 2017 or 2018"
         assert dtype in ['mc','data'], "Wrong data type '%s'! It should be 'mc' or 'data'!"%dtype
@@ -70,10 +88,24 @@ class TauTriggerChecks(Module):
         self.verbose     = verbose
         self.triggers    = trigdata
         self.trigmatcher = trigmatcher
+        self.matcherbank = TrigObjMatcherBank(trigmatcher,channels) # match all channels at once
+        self.precompute  = precompute # precompute trigger decisions per chunk of events
+        self.nmax        = nmax # maximum number of entries to precompute
+        self.nmatchobjs  = 0 # total number of objects matched to trigger objects, summed over channels
         
     def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
         """Create branches in output tree."""
         #outputFile.cd()
+        self.reader = NanoArrayReader(inputTree,{ # bind before the collections are used
+          'TrigObj':  ['id','filterBits','eta','phi'],
+          'Electron': ['pt','eta','phi'],
+          'Muon':     ['pt','eta','phi'],
+          'Tau':      ['pt','eta','phi'],
+        })
+        if self.precompute:
+          self.matcherbank.evaluate(inputTree,nmax=self.nmax) # trigger decisions of the processed entries, per chunk
+        else:
+          self.matcherbank.decisions = None # evaluate per event
         self.cutflows = { }
         self.out = wrappedOutputTree
         self.out.branch("nElectron_select",                    'I',title="number of electrons passing basic selections")
@@ -123,15 +155,21 @@ class TauTriggerChecks(Module):
     def analyze(self, event):
         """Process event, return True (pass, go to next module) or False (fail, go to next event)."""
         
+        # TRIGGER OBJECTS as arrays
+        reader            = self.reader.read(event._entry)
+        trigObjs          = reader.get('TrigObj')
+        triggers          = self.matcherbank.fire(event)
+        
         # MATCH & SELECT ELECTRONS
         channels          = ['etau','etau_SingleElectron']
         electrons         = Collection(event,'Electron')
         eles_select       = [ ]
         eles_match        = { c: [ ] for c in channels }
         eles_select_match = { c: [ ] for c in channels }
-        for electron in electrons:
+        matches           = self.matcherbank.matchArrays(trigObjs,reader.get('Electron'),11)
+        for i, electron in enumerate(electrons):
           for channel in eles_match:
-            if self.trigmatcher[channel].match(event,electron,leg=1):
+            if matches[(channel,1)][i]:
               eles_match[channel].append(electron)
           if abs(electron.pt) < self.eleptmin: continue
           if abs(electron.eta) > 2.4: continue
@@ -151,9 +189,10 @@ class TauTriggerChecks(Module):
         muons_select       = [ ]
         muons_match        = { c: [ ] for c in channels }
         muons_select_match = { c: [ ] for c in channels }
-        for muon in muons:
+        matches            = self.matcherbank.matchArrays(trigObjs,reader.get('Muon'),13)
+        for i, muon in enumerate(muons):
           for channel in channels:
-            if self.trigmatcher[channel].match(event,muon,leg=1):
+            if matches[(channel,1)][i]:
               muons_match[channel].append(muon)
           if abs(muon.pt) < self.muptmin: continue
           if abs(muon.eta) > 2.3: continue
@@ -169,10 +208,11 @@ class TauTriggerChecks(Module):
         taus_select       = [ ]
         taus_match        = { c: [ ] for c in self.crosstrigs }
         taus_select_match = { c: [ ] for c in self.crosstrigs }
-        for tau in taus:
+        matches           = self.matcherbank.matchArrays(trigObjs,reader.get('Tau'),15)
+        for i, tau in enumerate(taus):
           for channel in self.crosstrigs:
             leg = 1 if channel=='ditau' else 2
-            if self.trigmatcher[channel].match(event,tau,leg=leg):
+            if matches[(channel,leg)][i]:
               taus_match[channel].append(tau)
           if abs(tau.pt) < self.tauptmin: continue
           if abs(tau.eta) > 2.3: continue
@@ -214,22 +254,23 @@ class TauTriggerChecks(Module):
               npair_select_match['ditau'] += 1
         
         # FILL BRANCHES
-        triggers = { }
         self.out.fillBranch("nElectron_select",                    len(eles_select))
         self.out.fillBranch("nMuon_select",                        len(muons_select))
         self.out.fillBranch("nTau_select",                         len(taus_select))
         for channel in self.channels:
           self.cutflows[channel].Fill(self.Nocut)
-          triggers[channel] = self.trigmatcher[channel].fired(event)
           self.out.fillBranch("trigger_"+channel,                  triggers[channel])
           if 'etau' in channel:
+            self.nmatchobjs += len(eles_match[channel])
             self.out.fillBranch("nElectron_match_"+channel,        len(eles_match[channel]))
             self.out.fillBranch("nElectron_select_match_"+channel, len(eles_select_match[channel]))
           if 'mu' in channel:
+            self.nmatchobjs += len(muons_match[channel])
             self.out.fillBranch("nMuon_match_"+channel,            len(muons_match[channel]))
             self.out.fillBranch("nMuon_select_match_"+channel,     len(muons_select_match[channel]))
           if 'tau' in channel:
             if 'Single' not in channel:
+              self.nmatchobjs += len(taus_match[channel])
               self.out.fillBranch("nTau_match_"+channel,           len(taus_match[channel]))
               self.out.fillBranch("nTau_select_match_"+channel,    len(taus_select_match[channel]))
             self.out.fillBranch("nPair_select_"+channel,           npair_select[channel])
@@ -273,7 +314,7 @@ era        = args.era.upper()
 maxEvts    = args.nmax
 nFiles     = args.nfiles
 sample     = args.sample
-postfix    = '_trigger_%s%s_%s'%(year,era,dtype) + ('_'+sample if sample else "")
+postfix    = '_trigger_%s%s_%s'%(year,era,dtype) + ('_'+sample if sample else "") + ('_quick%d'%args.quick if args.quick>1 else "")
 branchsel  = "python/keep_and_drop_taus.txt"
 if not os.path.isfile(branchsel): branchsel = None
 plot       = True #and False
@@ -430,24 +471,83 @@ print ">>> %-10s = '%s'"%('dtype',dtype)
 print ">>> %-10s = '%s'"%('era',era)
 print ">>> %-10s = %s"%('maxEvts',maxEvts)
 print ">>> %-10s = %s"%('nFiles',nFiles)
+print ">>> %-10s = %s"%('quick',args.quick)
 print ">>> %-10s = '%s'"%('sample',sample)
 print ">>> %-10s = %s"%('infiles',infiles)
 print ">>> %-10s = %s"%('outfile',"'%s'"%outfile if outfile else None)
 print ">>> %-10s = '%s'"%('postfix',postfix)
 print ">>> %-10s = %s"%('branchsel',branchsel)
 
-module = TauTriggerChecks(year,dtype=dtype,verbose=True)
+module  = TauTriggerChecks(year,dtype=dtype,precompute=(args.quick<=1),nmax=maxEvts,verbose=True) # not all entries when sampling
+modules = [module]
+if args.quick>1:
+  sampler = ClusterSampler(args.quick) # first, so the other modules skip the unsampled clusters
+  modules.insert(0,sampler)
+if args.metrics:
+  monitor = MetricsMonitor(args.metrics,promfile=args.prom,counters={'matched': lambda: module.nmatchobjs})
+  modules.insert(-1,monitor) # after the sampler, so only processed events are counted
+if args.memcheck>0:
+  modules.insert(0,MemoryTracker(args.memcheck,maxrss=args.maxrss))
 if args.run:
   p = PostProcessor(outdir, infiles, None, branchsel=branchsel, outputbranchsel=branchsel, haddFileName=outfile,
-                    modules=[module], provenance=False, postfix=postfix, maxEntries=maxEvts)
+                    modules=modules, provenance=False, postfix=postfix, maxEntries=maxEvts)
   p.run()
+  if args.quick>1:
+    print ">>> quick look: sampled %d/%d events (%.1f%%) in one of every %d clusters"%(
+            sampler.nsampled,sampler.nevents,100.0*sampler.fraction(),args.quick)
+
+
+
+# SUMMARY of plotted histograms
+filename    = outfile or "%s/%s"%(outdir,infiles[0].split('/')[-1].replace(".root",postfix+".root"))
+summaryname = "%s/trigObjMatch_summary%s.root"%(outdir,postfix)
+channels    = [c for c in module.channels if dtype=='mc'
+                                              or (not 'Single' in c) #and not 'Single' in sample and not 'EGamma')
+                                              or ('Single' in c and ('Single' in sample or 'EGamma' in sample)) ]
+
+def getHistSet(channel):
+    """Get the branches, selections and titles of the histograms of matched objects in a channel."""
+    chanstr  = channel.split('_')[0].replace('mu',"#mu").replace('di',"tau").replace('tau',"#tau_{h}")
+    histset  = [ ]
+    if 'mu' in channel:
+      histset.append(("nMuon_select_match_%s"%channel,"trigger_%s && nMuon_select>=1"%channel,"Muon"))
+    if 'etau' in channel:
+      histset.append(("nElectron_select_match_%s"%channel,"trigger_%s && nElectron_select>=1"%channel,"Electron"))
+    if 'tau' in channel and 'Single' not in channel:
+      histset.append(("nTau_select_match_%s"%channel,"trigger_%s && nTau_select>=1"%channel,"#tau_{h}"))
+      #histset.append(("nTau_select_match_%s"%channel,"trigger_%s && nTau_select>=2"%channel,"#geq2 #tau_{h}"))
+    histset.append(("nPair_select_match_%s"%channel,"trigger_%s && nPair_select_%s>=1"%(channel,channel),"%s pair"%chanstr))
+    return histset
+
+def writeSummary(filename,summaryname,channels):
+    """Fill the plotted histograms from the event tree, and write them and the cutflows to a small summary file,
+    so the plots can be restyled without reading the tree again."""
+    print ">>> writing summary histograms to '%s'"%(summaryname)
+    file    = TFile(filename)
+    tree    = file.Get('Events')
+    summary = TFile(summaryname,'RECREATE')
+    for channel in channels:
+      for i, (branch, cut, htitle) in enumerate(getHistSet(channel)):
+        hname = "h%s_%s"%(i,branch)
+        hist  = TH1D(hname,htitle,5,0,5)
+        out   = tree.Draw("%s >> %s"%(branch,hname),cut,'gOff')
+        hist.Write(hname,TH1D.kOverwrite)
+      cutflow = file.Get("cutflow_%s"%channel)
+      summary.cd()
+      cutflow.Write(cutflow.GetName(),TH1D.kOverwrite)
+    summary.Close()
+    file.Close()
+
+if plot and (args.run or not os.path.isfile(summaryname) or
+             (os.path.isfile(filename) and os.path.getmtime(summaryname)<os.path.getmtime(filename))):
+  writeSummary(filename,summaryname,channels)
 
 
 
 # PLOT
 if plot:
   
-  def plotHists(hists,xtitle,plotname,header,ctexts=[ ],otext="",logy=False,y1=0.70):
+  def plotHists(hists,xtitle,header,ctexts=[ ],otext="",logy=False,y1=0.70):
       colors = [ kBlue, kRed, kGreen+2, kOrange, kMagenta+1 ]
       canvas   = TCanvas('canvas','canvas',100,100,800,700)
       canvas.SetMargin(0.12,0.03,0.14,0.06 if otext else 0.03)
@@ -497,26 +597,18 @@ if plot:
         latex.SetTextSize(0.05)
         latex.SetTextAlign(31)
         latex.DrawLatex(1.-canvas.GetRightMargin(),1.-0.84*canvas.GetTopMargin(),otext)
-      canvas.SaveAs(plotname+".png")
-      canvas.SaveAs(plotname+".pdf")
-      canvas.Close()
-      for hist in hists:
-        gDirectory.Delete(hist.GetName())
+      return canvas, legend, latex
   
-  filename   = outfile or "%s/%s"%(outdir,infiles[0].split('/')[-1].replace(".root",postfix+".root"))
-  file       = TFile(filename)
-  tree       = file.Get('Events')
+  file       = TFile(summaryname)
   postfix    = postfix.lstrip("_trigger")
   outdir     = ensureDirectory('plots')
   runexp     = re.compile(r"run>=(\d+) && run<=(\d+) && (\w+)")
+  queue      = PlotQueue(ncores=args.ncores,cachefile="%s/.plothashes.json"%(outdir),force=args.force)
   
   # PLOT PAIRS
   cutflows   = [ ]
   dataset    = re.findall(r"(DY\d?JetsToLL_M-50|Tau|SingleMuon|SingleElectron|EGamma)",infiles[0])[0]
   otext      = "%s (%d%s)"%('#font[82]{%s} dataset'%dataset,year,era)
-  channels   = [c for c in module.channels if dtype=='mc'
-                                              or (not 'Single' in c) #and not 'Single' in sample and not 'EGamma')
-                                              or ('Single' in c and ('Single' in sample or 'EGamma' in sample)) ]
   for channel in channels:
     print ">>> plotting filter pair for '%s'"%(channel)
     header   = "Selected object"
@@ -527,20 +619,9 @@ if plot:
     plotname = "%s/%s_pair_matched_%s"%(outdir,channel,postfix)
     path     = runexp.sub(r"\3 && \1 #leq run #leq \2",module.trigmatcher[channel].path)
     ctexts   = path.replace('||','\n||').split('\n') #"#kern[-0.3]{%s}"
-    histset  = [ ]
-    if 'mu' in channel:
-      histset.append(("nMuon_select_match_%s"%channel,"trigger_%s && nMuon_select>=1"%channel,"Muon"))
-    if 'etau' in channel:
-      histset.append(("nElectron_select_match_%s"%channel,"trigger_%s && nElectron_select>=1"%channel,"Electron"))
-    if 'tau' in channel and 'Single' not in channel:
-      histset.append(("nTau_select_match_%s"%channel,"trigger_%s && nTau_select>=1"%channel,"#tau_{h}"))
-      #histset.append(("nTau_select_match_%s"%channel,"trigger_%s && nTau_select>=2"%channel,"#geq2 #tau_{h}"))
-    histset.append(("nPair_select_match_%s"%channel,"trigger_%s && nPair_select_%s>=1"%(channel,channel),"%s pair"%chanstr))    
-    hists  = [ ]
-    for i, (branch, cut, htitle) in enumerate(histset):
-      hname = "h%s_%s"%(i,branch)
-      hist  = TH1D(hname,htitle,5,0,5)
-      out   = tree.Draw("%s >> %s"%(branch,hname),cut,'gOff')
+    hists    = [ ]
+    for i, (branch, cut, htitle) in enumerate(getHistSet(channel)):
+      hist  = file.Get("h%s_%s"%(i,branch))
       if hist.Integral()>0:
         hist.Scale(100./hist.Integral())
       else:
@@ -550,20 +631,18 @@ if plot:
     for ibin in xrange(1,frame.GetXaxis().GetNbins()+1):
       xbin = frame.GetBinLowEdge(ibin)
       frame.GetXaxis().SetBinLabel(ibin,str(int(xbin)))
-    plotHists(hists,xtitle,plotname,header,ctexts,otext=otext)
+    queue.add(plotHists,hists,plotname,xtitle,header,ctexts,otext=otext)
     
     # CUTFLOW
     cutflow = file.Get("cutflow_%s"%channel)
     cutflow.SetTitle(trigger)
     cutflow.GetXaxis().SetRange(1,8)
+    total = cutflow.GetBinContent(1)
+    fired = cutflow.GetBinContent(2)
     pair  = cutflow.GetBinContent(5)
     match = cutflow.GetBinContent(6)
-    if pair:
-      eff   = match/pair
-      error = sqrt(eff*(1.-eff)/pair)*100.0
-      print ">>> %s pair selection -> trigger-matching = %d/%d = %s"%(channel,match,pair,bold("%.2f +- %.2f%%"%(100.0*(match-pair)/pair,error)))
-    else:
-      print ">>> %s pair selection -> trigger-matching = %d/%d ..."%(channel,match,pair)
+    print ">>> %s trigger fraction = %s"%(channel,formatEff(fired,total))
+    print ">>> %s pair selection -> trigger-matching = %s"%(channel,bold(formatEff(match,pair)))
     if cutflow.GetBinContent(1)>0:
       cutflow.Scale(100./cutflow.GetBinContent(1))
     else:
@@ -574,7 +653,8 @@ if plot:
   print ">>> plotting cutflows"
   header   = "Channel"
   plotname = "%s/cutflow_%s"%(outdir,postfix)
-  plotHists(cutflows,"",plotname,header,logy=True,otext=otext,y1=0.8)
+  queue.add(plotHists,cutflows,plotname,"",header,logy=True,otext=otext,y1=0.8)
+  queue.run()
   
   file.Close()
   
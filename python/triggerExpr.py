@@ -0,0 +1,234 @@
+#! /usr/bin/env python
+# Description: Parse trigger expressions (like Trigger.patheval, e.g. "e.run>=315974 and e.HLT_IsoMu24 or not e.HLT_X")
+#              into an expression tree, and evaluate it on whole arrays of HLT decisions and run numbers per chunk of events
+import os, re, operator
+import numpy as np
+
+tokenexp  = re.compile(r"\s*(?:(\(|\)|\|\||&&|<=|>=|==|!=|<|>|!)|(-?\d+)|(?:e\.)?(\w+))")
+keywords  = { 'or': '||', 'and': '&&', 'not': '!' }
+operators = { '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '==': operator.eq, '!=': operator.ne }
+
+
+class Path:
+    """Decision of an HLT path (or any boolean branch)."""
+    def __init__(self,name):
+        self.name = name
+    def __str__(self):
+        return self.name
+    def branches(self):
+        return set([self.name])
+    def evaluate(self,arrays):
+        return arrays[self.name]!=0
+
+
+class Compare:
+    """Comparison of a branch to a number, e.g. a run range condition."""
+    def __init__(self,name,op,value):
+        self.name  = name
+        self.op    = op
+        self.value = value
+    def __str__(self):
+        return "%s%s%s"%(self.name,self.op,self.value)
+    def branches(self):
+        return set([self.name])
+    def evaluate(self,arrays):
+        return operators[self.op](arrays[self.name],self.value)
+
+
+class Not:
+    """Veto."""
+    def __init__(self,node):
+        self.node = node
+    def __str__(self):
+        return "!(%s)"%(self.node) if isinstance(self.node,(And,Or)) else "!%s"%(self.node)
+    def branches(self):
+        return self.node.branches()
+    def evaluate(self,arrays):
+        return ~self.node.evaluate(arrays)
+
+
+class And:
+    """All conditions."""
+    symbol = ' && '
+    def __init__(self,nodes):
+        self.nodes = nodes
+    def __str__(self):
+        return self.symbol.join("(%s)"%n if isinstance(n,(And,Or)) else str(n) for n in self.nodes)
+    def branches(self):
+        return set().union(*[n.branches() for n in self.nodes])
+    def evaluate(self,arrays):
+        result = self.nodes[0].evaluate(arrays)
+        for node in self.nodes[1:]:
+          result = result & node.evaluate(arrays)
+        return result
+
+
+class Or(And):
+    """Any condition."""
+    symbol = ' || '
+    def evaluate(self,arrays):
+        result = self.nodes[0].evaluate(arrays)
+        for node in self.nodes[1:]:
+          result = result | node.evaluate(arrays)
+        return result
+
+
+def tokenize(string):
+  """Split an expression into tokens; python keywords are replaced by their C++ symbols."""
+  tokens = [ ]
+  pos    = 0
+  string = string.strip()
+  while pos<len(string):
+    match = tokenexp.match(string,pos)
+    if not match or match.end()==pos:
+      raise SyntaxError("Could not parse trigger expression '%s' at position %d"%(string,pos))
+    symbol, number, name = match.groups()
+    if symbol:
+      tokens.append(symbol)
+    elif number:
+      tokens.append(int(number))
+    else:
+      tokens.append(keywords[name] if name in keywords else ('name',name))
+    pos = match.end()
+  return tokens
+
+
+def parseExpr(string):
+  """Parse a trigger expression into a tree of Path, Compare, Not, And and Or nodes.
+  Both python ('e.HLT_X or not e.HLT_Y', like Trigger.patheval) and C++ ('HLT_X || !HLT_Y') syntax are accepted."""
+  tokens = tokenize(string)
+  pos    = [0]
+
+  def peek():
+    return tokens[pos[0]] if pos[0]<len(tokens) else None
+
+  def take(expected=None):
+    token = peek()
+    if token==None or (expected and token!=expected):
+      raise SyntaxError("Expected %r in trigger expression '%s', got %r"%(expected or 'token',string,token))
+    pos[0] += 1
+    return token
+
+  def parseOr():
+    nodes = [parseAnd()]
+    while peek()=='||':
+      take()
+      nodes.append(parseAnd())
+    return nodes[0] if len(nodes)==1 else Or(nodes)
+
+  def parseAnd():
+    nodes = [parseUnary()]
+    while peek()=='&&':
+      take()
+      nodes.append(parseUnary())
+    return nodes[0] if len(nodes)==1 else And(nodes)
+
+  def parseUnary():
+    token = take()
+    if token=='!':
+      return Not(parseUnary())
+    if token=='(':
+      node = parseOr()
+      take(')')
+      return node
+    if isinstance(token,tuple):
+      if peek() in operators:
+        op    = take()
+        value = take()
+        if not isinstance(value,int):
+          raise SyntaxError("Expected number after '%s' in trigger expression '%s', got %r"%(op,string,value))
+        return Compare(token[1],op,value)
+      return Path(token[1])
+    raise SyntaxError("Unexpected %r in trigger expression '%s'"%(token,string))
+
+  node = parseOr()
+  if peek()!=None:
+    raise SyntaxError("Unexpected %r in trigger expression '%s'"%(peek(),string))
+  return node
+
+
+def readArrays(tree,branches,start=0,nentries=100000):
+  """Read a chunk of entries of some numerical branches into numpy arrays with TTree::Draw,
+  up to four branches per pass. Missing branches (e.g. HLT paths not in this menu) are set to zero."""
+  nentries = max(0,min(nentries,tree.GetEntries()-start))
+  arrays   = { }
+  names    = [ ]
+  for branch in sorted(branches):
+    if tree.GetBranch(branch):
+      names.append(branch)
+    else:
+      arrays[branch] = np.zeros(nentries)
+  if nentries<=0:
+    return arrays
+  tree.SetEstimate(nentries+1)
+  for i in xrange(0,len(names),4):
+    group = names[i:i+4]
+    n     = tree.Draw(':'.join(group),"","goff",nentries,start)
+    for j, branch in enumerate(group):
+      buffer = tree.GetVal(j)
+      buffer.SetSize(n)
+      arrays[branch] = np.frombuffer(buffer,dtype=np.float64,count=n).copy()
+  return arrays
+
+
+def evaluateChunks(tree,exprs,chunksize=100000,nmax=-1):
+  """Evaluate a dictionary of name -> expression tree on a tree, chunk by chunk.
+  Yields the first entry of the chunk, and a dictionary of name -> boolean array."""
+  branches = set().union(*[e.branches() for e in exprs.itervalues()]) if exprs else set()
+  nentries = tree.GetEntries() if nmax<0 else min(nmax,tree.GetEntries())
+  for start in xrange(0,nentries,chunksize):
+    arrays = readArrays(tree,branches,start,min(chunksize,nentries-start))
+    yield start, { n: e.evaluate(arrays) for n, e in exprs.iteritems() }
+
+
+def evaluateTree(tree,exprs,chunksize=100000,nmax=-1):
+  """Evaluate a dictionary of name -> expression tree on all entries of a tree.
+  Returns a dictionary of name -> boolean array, indexed by entry."""
+  results = { n: [ ] for n in exprs }
+  for start, decisions in evaluateChunks(tree,exprs,chunksize=chunksize,nmax=nmax):
+    for name, decision in decisions.iteritems():
+      results[name].append(decision)
+  return { n: np.concatenate(d) if d else np.zeros(0,dtype=bool) for n, d in results.iteritems() }
+
+
+def main(args):
+  from ROOT import TFile
+  from TrigObjMatcher import loadTriggerDataFromJSON, TrigObjMatcher
+  trigdata = loadTriggerDataFromJSON(args.json or "json/tau_triggers_%d.json"%args.year,isData=args.dtype=='data')
+  exprs    = { c: TrigObjMatcher(t).expr for c, t in trigdata.combdict.iteritems() }
+  for channel in sorted(exprs):
+    print ">>> %-16s %s"%(channel,exprs[channel])
+  for filename in args.infiles:
+    file   = TFile.Open(filename)
+    tree   = file.Get('Events')
+    counts = { c: 0 for c in exprs }
+    ntot   = tree.GetEntries() if args.nmax<0 else min(args.nmax,tree.GetEntries())
+    for start, decisions in evaluateChunks(tree,exprs,chunksize=args.chunksize,nmax=args.nmax):
+      for channel, decision in decisions.iteritems():
+        counts[channel] += np.count_nonzero(decision)
+    print ">>> %s: %d events"%(filename,ntot)
+    for channel in sorted(counts):
+      print ">>>   %-16s %10d %8.2f%%"%(channel,counts[channel],100.0*counts[channel]/ntot if ntot else 0.0)
+    file.Close()
+
+
+
+if __name__ == '__main__':
+  from argparse import ArgumentParser
+  description = """Count the events firing each trigger channel of the JSON file, evaluated per chunk of events."""
+  parser = ArgumentParser(prog="triggerExpr.py",description=description,epilog="Good luck!")
+  parser.add_argument('infiles',           nargs='+',
+                                           help="nanoAOD files" )
+  parser.add_argument('-y', '--year',      type=int, choices=[2016,2017,2018], default=2018,
+                                           help="year of the JSON file" )
+  parser.add_argument('-j', '--json',      default=None,
+                                           help="JSON file with triggers (default: json/tau_triggers_<year>.json)" )
+  parser.add_argument('-d', '--dtype',     choices=['data','mc'], default='data',
+                                           help="data type" )
+  parser.add_argument('-c', '--chunksize', type=int, default=100000,
+                                           help="number of events per chunk" )
+  parser.add_argument('-n', '--nmax',      type=int, default=-1,
+                                           help="maximum number of events per file" )
+  args = parser.parse_args()
+  main(args)
+
@@ -1,4 +1,5 @@
-import os
+import os, atexit
+from collections import OrderedDict
 from ROOT import TFile, TH1
 
 def ensureDirectory(dirname):
@@ -10,8 +11,11 @@ def ensureDirectory(dirname):
       print '>>> failed to make directory "%s"'%(dirname)
   return dirname
   
-def ensureTFile(filename,option='READ'):
-  """Open TFile, checking if the file in the given path exists."""
+def ensureTFile(filename,option='READ',cache=False):
+  """Open TFile, checking if the file in the given path exists.
+  With cache=True, a read-only file is kept open in a LRU cache, and should not be closed by the user."""
+  if cache and option=='READ':
+    return tfilecache.getFile(filename)
   if not os.path.isfile(filename):
     raise OSError('File in path "%s" does not exist!'%(filename))
     exit(1)
@@ -46,14 +50,88 @@ def extractTH1(file,histname,setdir=True):
     hist.SetDirectory(0)
   return hist
   
-def ensureTFileAndTH1(filename,histname,verbose=True,setdir=True):
-  """Open a TFile and get a histogram."""
+def ensureTFileAndTH1(filename,histname,verbose=True,setdir=True,cache=False):
+  """Open a TFile and get a histogram.
+  With cache=True, the file and detached histogram are shared via a LRU cache,
+  so they should not be closed or modified by the user (clone the histogram if needed)."""
   if verbose:
     print ">>>   %s"%(filename)
+  if cache:
+    file = tfilecache.getFile(filename)
+    hist = tfilecache.getHist(filename,histname)
+    return file, hist
   file = ensureTFile(filename,'READ')
   hist = extractTH1(file,histname,setdir=setdir)
   return file, hist
   
+class TFileCache:
+  """Bounded LRU cache of read-only TFiles, keyed by (path, mtime),
+  and of detached histograms, keyed by (path, histname, mtime).
+  Files are closed when evicted, when they change on disk, or at exit."""
+  
+  def __init__(self,maxfiles=10,maxhists=500):
+    self.maxfiles = maxfiles
+    self.maxhists = maxhists
+    self.files    = OrderedDict() # (path, mtime) -> TFile, least recently used first
+    self.hists    = OrderedDict() # (path, histname, mtime) -> TH1, least recently used first
+  
+  def __repr__(self):
+    """Returns string representation of TFileCache object."""
+    return "<%s(%d/%d files,%d/%d hists) at %s>"%(self.__class__.__name__,
+             len(self.files),self.maxfiles,len(self.hists),self.maxhists,hex(id(self)))
+  
+  def _key(self,filename):
+    """Get absolute path and modification time."""
+    if not os.path.isfile(filename):
+      raise OSError('File in path "%s" does not exist!'%(filename))
+    path = os.path.abspath(filename)
+    return path, os.path.getmtime(path)
+  
+  def getFile(self,filename):
+    """Get an open file from the cache, or open it."""
+    path, mtime = self._key(filename)
+    key  = (path,mtime)
+    file = self.files.pop(key,None)
+    if file==None:
+      self.evict(path,keep=mtime) # remove outdated versions
+      file = ensureTFile(path,'READ')
+      while len(self.files)>=self.maxfiles:
+        self._closeFile(*self.files.popitem(last=False))
+    self.files[key] = file # most recently used
+    return file
+  
+  def getHist(self,filename,histname):
+    """Get a detached histogram from the cache, or extract it from a (cached) file."""
+    path, mtime = self._key(filename)
+    key  = (path,histname,mtime)
+    hist = self.hists.pop(key,None)
+    if hist==None:
+      hist = extractTH1(self.getFile(path),histname,setdir=True)
+      while len(self.hists)>=self.maxhists:
+        self.hists.popitem(last=False)
+    self.hists[key] = hist # most recently used
+    return hist
+  
+  def evict(self,filename=None,keep=None):
+    """Remove a file and its histograms from the cache, or everything if no file is given.
+    If keep is given, only remove the versions of the file with another modification time."""
+    path = os.path.abspath(filename) if filename else None
+    for key in [k for k in self.hists if path==None or (k[0]==path and k[-1]!=keep)]:
+      del self.hists[key]
+    for key in [k for k in self.files if path==None or (k[0]==path and k[-1]!=keep)]:
+      self._closeFile(key,self.files.pop(key))
+  
+  def _closeFile(self,key,file):
+    if file and file.IsOpen():
+      file.Close()
+  
+  def close(self):
+    """Close all files, and clear the cache."""
+    self.evict()
+  
+tfilecache = TFileCache()
+atexit.register(tfilecache.close)
+  
 def bold(string):
   return '\033[1m'+string+'\033[0m'
   